@@ -0,0 +1,207 @@
+'''
+a local stand-in for the internet: fixture pages plus fake SEMRush and
+Serpstat endpoints, all served from one ThreadingHTTPServer on 127.0.0.1
+'''
+import json
+import random
+import sys
+import threading
+import time
+import types
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# fixture kinds and what they exercise
+KINDS = {
+    'small': 'a short article',
+    'huge': 'a ~2MB article, bigger than most real pages',
+    'slow': 'a short article sent after --slow seconds',
+    'redirect': 'a 302 to a small page',
+    'pdf': 'a 1MB application/pdf, should be rejected before the body is read',
+    'charset': 'windows-1252 bytes with no charset declared anywhere',
+}
+
+WORDS = ('the quick brown fox jumps over a lazy dog while seven wizards quietly hex '
+         'jumbo crates of liquor near the river bank every morning before breakfast').split()
+
+
+def _paragraphs(count: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return ''.join(
+        '<p>' + '. '.join(' '.join(rng.choice(WORDS) for _ in range(12)).capitalize() for _ in range(5)) + '.</p>'
+        for _ in range(count)
+    )
+
+
+def article(title: str, paragraphs: int, seed: int = 0) -> str:
+    return (
+        '<!doctype html><html><head><meta charset="utf-8">'
+        f'<title>{title}</title><meta name="description" content="{title} description">'
+        f'<meta property="og:title" content="{title}"><meta name="twitter:card" content="summary">'
+        f'</head><body><article><h1>{title}</h1>{_paragraphs(paragraphs, seed)}</article></body></html>'
+    )
+
+
+class Fixtures:
+    ''' response bodies, built once per server '''
+
+    def __init__(self) -> None:
+        self.small = article('Small fixture page', 8).encode('utf-8')
+        self.huge = article('Huge fixture page', 3000, seed=1).encode('utf-8')
+        self.pdf = b'%PDF-1.4\n' + b'0' * (1024 ** 2)
+        self.charset = article('Café fixture “quoted”', 8, seed=2).replace(
+            '<meta charset="utf-8">', '').encode('cp1252')
+
+
+def semrush_organic(url: str, limit: int, seed: int) -> str:
+    rng = random.Random(seed)
+    lines = ['Keyword;Position;Position Difference;Traffic (%);Search Volume;Url']
+    for i in range(limit):
+        phrase = ' '.join(rng.choice(WORDS) for _ in range(3))
+        lines.append(f'"{phrase}%20{i}";"{rng.randint(1, 20)}";"{rng.randint(-5, 5)}";'
+                     f'"{rng.random() * 10:.2f}";"{rng.randint(10, 100000)}";"{url}"')
+    return '\r\n'.join(lines)
+
+
+def semrush_phrases(phrases: List[str]) -> str:
+    lines = ['Keyword;Search Volume;Trends']
+    for phrase in phrases:
+        lines.append(f'"{phrase.lower()}";"{len(phrase) * 100}";"0.81,1.00,0.81"')
+    return '\r\n'.join(lines) if len(lines) > 1 else 'ERROR 50 :: NOTHING FOUND'
+
+
+def serpstat_hits(query: str, size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    hits = [{
+        'keyword': ' '.join(rng.choice(WORDS) for _ in range(3)),
+        'region_queries_count': rng.randint(10, 100000),
+        'position': rng.randint(1, 20),
+        'traff': rng.randint(0, 5000),
+        'url': query,
+    } for _ in range(size)]
+    return json.dumps({'result': {'hits': hits}})
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: 'BenchServer'
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; don't let them wait on delayed acks
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path.strip('/').split('/')
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        fixtures = self.server.fixtures
+
+        if path[0] == 'semrush':
+            time.sleep(self.server.api_latency)
+            if query.get('type') == 'url_organic':
+                text = semrush_organic(query.get('url', ''), int(query.get('display_limit', 25)), zlib.crc32(query.get('url', '').encode()))
+            else:
+                text = semrush_phrases(unquote(query.get('phrase', '')).split(';'))
+            return self._send(200, text.encode('utf-8'), 'text/plain')
+
+        if path[0] == 'serpstat':
+            time.sleep(self.server.api_latency)
+            text = serpstat_hits(query.get('query', ''), int(query.get('page_size', 25)), zlib.crc32(query.get('query', '').encode()))
+            return self._send(200, text.encode('utf-8'), 'application/json')
+
+        if path[0] != 'page' or len(path) < 2 or path[1] not in KINDS:
+            return self._send(404, b'not found', 'text/plain')
+
+        time.sleep(self.server.page_latency)
+        kind = path[1]
+        if kind == 'small':
+            self._send(200, fixtures.small, 'text/html; charset=utf-8')
+        elif kind == 'huge':
+            self._send(200, fixtures.huge, 'text/html; charset=utf-8')
+        elif kind == 'slow':
+            time.sleep(self.server.slow)
+            self._send(200, fixtures.small, 'text/html; charset=utf-8')
+        elif kind == 'redirect':
+            self._send(302, b'', 'text/html', {'Location': '/page/small/' + '/'.join(path[2:])})
+        elif kind == 'pdf':
+            self._send(200, fixtures.pdf, 'application/pdf')
+        elif kind == 'charset':
+            self._send(200, fixtures.charset, 'text/html')
+
+
+class BenchServer(ThreadingHTTPServer):
+    '''
+    fixture pages under /page/<kind>/<n> (see KINDS) and fake APIs under
+    /semrush and /serpstat. every page waits `page_latency` seconds and every
+    API call `api_latency` seconds before answering.
+    usage:
+
+    with BenchServer(api_latency=0.05) as server:
+        server.use_config()
+        Page.fetch(server.url('small', 1))
+
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, page_latency: float = 0.0, api_latency: float = 0.0, slow: float = 1.0) -> None:
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.page_latency = page_latency
+        self.api_latency = api_latency
+        self.slow = slow
+        self.fixtures = Fixtures()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def handle_error(self, request, client_address) -> None:
+        # clients hang up on purpose, e.g. on a pdf they won't download
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+    def __enter__(self) -> 'BenchServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def url(self, kind: str, n: int = 0) -> str:
+        return f'{self.base_url}/page/{kind}/{n}'
+
+    def use_config(self) -> None:
+        point_config_at(self.base_url)
+
+
+def point_config_at(base_url: str) -> None:
+    '''
+    send SEMRush and Serpstat calls to the fake endpoints. works with or
+    without a core/apis/config.py: the real one keeps its tokens but gets new
+    endpoints, otherwise a config with dummy tokens is put in its place
+    '''
+    try:
+        import core.apis.config as config
+    except ImportError:
+        config = types.ModuleType('core.apis.config')
+        config.SEMRUSH_TOKEN = config.SERP_STAT_TOKEN = 'benchmark'
+        config.DEFAULT_SE = 'g_us'
+        config.DEFAULT_DATABASE = 'us'
+        sys.modules['core.apis.config'] = config
+
+    config.SEMRUSH_ENDPOINT = f'{base_url}/semrush'
+    config.SERP_STAT_ENDPOINT = f'{base_url}/serpstat'
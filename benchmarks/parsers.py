@@ -0,0 +1,94 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.html_reader import HTMLReader, PARSERS
+from core.page import Page
+
+
+def sample_pages() -> List[bytes]:
+    '''
+    a few synthetic pages for when no html files are given, including the
+    malformed markup real pages have: a <title> with no <head> around it,
+    comments inside h1s and titles, and <meta> tags in the body
+    '''
+    body = ''.join(f'<p>Paragraph {i} with <a href="/p/{i}">a link</a> and some text.</p>' for i in range(2000))
+    return [
+        b'<html><head><title>Small page</title><meta name="description" content="tiny"></head><body><h1>Hello</h1></body></html>',
+        (
+            '<!doctype html><html><head><meta charset="utf-8"><title> Big page </title>'
+            '<meta name="description" content="a large page"><meta property="og:title" content="OG">'
+            '<meta name="twitter:card" content="summary"></head>'
+            f'<body><div><h1>Main heading</h1>{body}<h1>Second</h1></div></body></html>'
+        ).encode('utf-8'),
+        b'<html><head><title>No h1</title></head><body><h1><span>nested</span></h1><meta name="description" content="late"></body></html>',
+        b'<title>Headless</title><meta name="description" content="no head tag"><h1>Heading</h1><p>text</p>',
+        b'<html><head><title>Comments</title></head><body><h1><!-- lead -->Heading</h1><h1>Second<!-- tail --></h1></body></html>',
+        b'<html><head><title>Lone comment</title></head><body><h1><!-- only a comment --></h1></body></html>',
+        b'<html><head><title><!-- draft -->Commented title</title></head><body><h1>Heading</h1></body></html>',
+        (
+            b'<html><head><title>Stray meta</title></head><body><h1>Heading</h1>'
+            b'<meta name="description" content="in the body"><meta property="og:title" content="body og"></body></html>'
+        ),
+    ]
+
+
+def differences(report: Dict[str, str], reference: Dict[str, str]) -> List[str]:
+    return [key for key in reference if report.get(key) != reference[key]]
+
+
+def main():
+    '''
+    python benchmarks/parsers.py [page.html ...] -n 20
+
+    parses every page with every available HTMLReader backend (and the
+    head_only scan), compares csv_report with the html.parser reference and
+    prints the average time per page for each backend, plus which fields
+    differ on which pages.
+
+    expected differences on malformed pages: html.parser builds no implied
+    <head>, so a headless page has no title there, and it reads a comment
+    inside <title> as a comment, where the html5 parsers (lxml, html5lib,
+    lexbor, head_only) keep it as title text the way browsers do.
+    '''
+    parser = argparse.ArgumentParser(description='compare HTMLReader parser backends')
+    parser.add_argument('files', nargs='*', help='html files (default: built in samples)')
+    parser.add_argument('-n', type=int, help='repetitions per page', default=20)
+    args = parser.parse_args()
+
+    files = [f for pattern in args.files for f in glob.glob(pattern)]
+    bodies = [open(f, 'rb').read() for f in files] or sample_pages()
+    pages = [Page('http://example.com/', 'http://example.com/', 200, 'OK', {'content-type': 'text/html'}, b) for b in bodies]
+
+    reference = [HTMLReader(p.url, page=p, parser='html.parser').csv_report for p in pages]
+
+    print(f"{'backend':<12} {'ms/page':>10}  identical csv_report")
+    for backend in [*PARSERS, 'head_only']:
+        options = {'head_only': True} if backend == 'head_only' else {'parser': backend}
+        try:
+            reports = [HTMLReader(p.url, page=p, **options).csv_report for p in pages]
+        except Exception as e:
+            print(f"{backend:<12} {'-':>10}  unavailable: {e}")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.n):
+            for p in pages:
+                HTMLReader(p.url, page=p, **options).csv_report
+        elapsed = (time.perf_counter() - start) / (args.n * len(pages))
+
+        mismatches = [
+            f"page {i}: {', '.join(fields)}"
+            for i, (a, b) in enumerate(zip(reports, reference)) if (fields := differences(a, b))
+        ]
+        same = 'yes' if not mismatches else f"NO ({'; '.join(mismatches)})"
+        print(f"{backend:<12} {elapsed * 1000:>10.2f}  {same}")
+
+
+if __name__ == "__main__":
+    main()
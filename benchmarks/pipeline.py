@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import csv
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from functools import wraps
+from statistics import quantiles
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import KINDS, BenchServer, point_config_at
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ''' p50 / p95 / p99 in milliseconds '''
+    if not latencies:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    if len(latencies) == 1:
+        return {p: latencies[0] * 1000 for p in ('p50', 'p95', 'p99')}
+
+    cuts = quantiles(latencies, n=100, method='inclusive')
+    return {'p50': cuts[49] * 1000, 'p95': cuts[94] * 1000, 'p99': cuts[98] * 1000}
+
+
+def peak_rss_mb() -> float:
+    ''' peak resident memory of this process and its finished children (process pool workers) '''
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in KB on linux, bytes on macos
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return max(own, children) / scale
+
+
+def timed(fn: Callable, calls: int) -> List[float]:
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        try:
+            fn(i)
+        except Exception:
+            pass  # failures (pdf, size cap) are part of the workload
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+# component benchmarks: each returns {stage name: latencies}
+
+def bench_fetch(base_url: str, calls: int) -> Dict[str, List[float]]:
+    from core.page import Page
+
+    return {
+        f'Page.fetch {kind}': timed(lambda i: Page.fetch(f'{base_url}/page/{kind}/{i}'), calls)
+        for kind in KINDS if kind != 'slow'
+    }
+
+
+def bench_html(base_url: str, calls: int) -> Dict[str, List[float]]:
+    from core.html_reader import HTMLReader
+    from core.page import Page
+
+    results = {}
+    for kind in ('small', 'huge', 'charset'):
+        page = Page.fetch(f'{base_url}/page/{kind}/0')
+        results[f'HTMLReader {kind}'] = timed(lambda i: HTMLReader(page.url, page=page).csv_report, calls)
+        results[f'HTMLReader {kind} head_only'] = timed(
+            lambda i: HTMLReader(page.url, page=page, head_only=True).csv_report, calls)
+    return results
+
+
+def bench_text(base_url: str, calls: int) -> Dict[str, List[float]]:
+    from core.page import Page
+    from core.text_extract import text_report
+
+    results = {}
+    for kind in ('small', 'huge'):
+        page = Page.fetch(f'{base_url}/page/{kind}/0')
+        results[f'text_report {kind}'] = timed(lambda i: text_report(page.url, page.text), calls)
+    return results
+
+
+def bench_apis(base_url: str, calls: int) -> Dict[str, List[float]]:
+    point_config_at(base_url)
+    import core.ratelimit as ratelimit
+    from core.apis.semrush import SEMRushQuery
+    from core.apis.serpstat import SERPStatQuery
+
+    # time the clients, not the api quota they pace themselves to
+    ratelimit.configure('semrush', 0)
+
+    def organic(i: int, limit: int):
+        q = SEMRushQuery()
+        q.request(f'{base_url}/page/small/{i}', limit=limit)
+        return q.results
+
+    def volumes(i: int):
+        q = SEMRushQuery()
+        q.request_volumes([f'phrase {i} {j}' for j in range(100)])
+
+    def serpstat(i: int):
+        q = SERPStatQuery()
+        q.limit_requests = False
+        return q.request(f'{base_url}/page/small/{i}').results
+
+    return {
+        'SEMRush url_organic 25': timed(lambda i: organic(i, 25), calls),
+        'SEMRush url_organic 10000': timed(lambda i: organic(i, 10000), max(1, calls // 10)),
+        'SEMRush 100 phrase volumes': timed(volumes, calls),
+        'Serpstat url_keywords': timed(serpstat, calls),
+    }
+
+
+def bench_pipeline(base_url: str, rows: int, flags: List[str]) -> Dict[str, List[float]]:
+    ''' the whole of fetch.py over a csv of fixture urls, timing each row's stages '''
+    point_config_at(base_url)
+    import fetch
+
+    latencies: Dict[str, List[float]] = {}
+
+    def stage(name: str, fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                latencies.setdefault(name, []).append(time.perf_counter() - start)
+        return wrapper
+
+    fetch.text_data = stage('pipeline text + meta', fetch.text_data)
+    fetch.seo_data = stage('pipeline seo', fetch.seo_data)
+    fetch.process_keywords = stage('pipeline keyword batch', fetch.process_keywords)
+    fetch.process_batch = stage('pipeline row', fetch.process_batch)
+
+    kinds = list(KINDS)
+    workdir = tempfile.mkdtemp(prefix='batchfetch-bench-')
+    os.chdir(workdir)
+    os.makedirs('output_files')
+
+    with open('input.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['location'])
+        for i in range(rows):
+            key = f'phrase number {i}' if '-k' in flags else f'{base_url}/page/{kinds[i % len(kinds)]}/{i}'
+            writer.writerow([key])
+
+    sys.argv = ['fetch.py', 'input.csv', '-c', 'location', '-f', 'bench', '--api_key', 'benchmark',
+                '--no-api-cache', '-d', '0', *flags]
+    args = fetch.parse_args()
+
+    start = time.perf_counter()
+    asyncio.run(fetch.run(args))
+    latencies['pipeline total'] = [time.perf_counter() - start]
+
+    return latencies
+
+
+def _run_section(queue, section: str, base_url: str, calls: int, rows: int, flags: List[str]) -> None:
+    ''' child process entry, so peak RSS is measured per section '''
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if section == 'pipeline':
+            result = bench_pipeline(base_url, rows, flags)
+        else:
+            result = SECTIONS[section](base_url, calls)
+
+    queue.put((result, peak_rss_mb()))
+
+
+SECTIONS = {
+    'fetch': bench_fetch,
+    'html': bench_html,
+    'text': bench_text,
+    'apis': bench_apis,
+}
+
+
+def main():
+    '''
+    python benchmarks/pipeline.py -n 20 --rows 200 --api-latency 0.05
+
+    serves fixture pages and fake SEMRush / Serpstat endpoints locally, then
+    times each component and the full fetch.py pipeline against them. each
+    section runs in its own process and reports calls/sec, p50/p95/p99
+    latency per stage and that process's peak RSS. nothing leaves the machine
+    and no api units are spent.
+    '''
+    parser = argparse.ArgumentParser(description='offline throughput benchmarks')
+    parser.add_argument('-n', type=int, help='calls per component stage', default=20)
+    parser.add_argument('--rows', type=int, help='input rows for the pipeline run', default=120)
+    parser.add_argument('--sections', nargs='+', choices=[*SECTIONS, 'pipeline'], default=[*SECTIONS, 'pipeline'])
+    parser.add_argument('--flags', type=str, help='extra fetch.py flags for the pipeline run', default='-s')
+    parser.add_argument('--page-latency', type=float, help='seconds every fixture page waits', default=0.0)
+    parser.add_argument('--api-latency', type=float, help='seconds every api call waits', default=0.0)
+    parser.add_argument('--slow', type=float, help='extra seconds for /page/slow', default=1.0)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+
+    with BenchServer(page_latency=args.page_latency, api_latency=args.api_latency, slow=args.slow) as server:
+        print(f"{'stage':<36} {'calls':>6} {'calls/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+
+        for section in args.sections:
+            queue = context.Queue()
+            child = context.Process(target=_run_section, args=(
+                queue, section, server.base_url, args.n, args.rows, args.flags.split()))
+            child.start()
+            result, rss = queue.get()
+            child.join()
+
+            for name, latencies in result.items():
+                p = percentiles(latencies)
+                total = sum(latencies)
+                rate = len(latencies) / total if total else 0.0
+                if name == 'pipeline total':
+                    name, rate = f'pipeline total ({args.rows} rows)', args.rows / total
+                print(f"{name:<36} {len(latencies):>6} {rate:>9.1f} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['p99']:>9.1f}")
+
+            print(f"{'  ' + section + ' peak RSS':<36} {rss:>6.0f} MB\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.models as models
+from core.records import MetaReport, MetaTag, PropertyTag, QueryRecord
+
+
+def keyword_rows(n: int) -> List[dict]:
+    return [
+        {'ph': f'keyword {i}', 'po': i % 100 + 1, 'pd': '0', 'tr': 0.5, 'nq': 1000 + i,
+         'et': i % 50, 'ur': f'https://example.com/page/{i}', 'td': None}
+        for i in range(n)
+    ]
+
+
+def meta_report(build_tag: Callable, build_property: Callable, build_report: Callable, tags: int):
+    return build_report(
+        url='https://example.com/', domain='https://example.com', user_agent='bench',
+        titles=['Title'], meta_descriptions=['Description'], h1s=['Heading'],
+        meta_tags=[build_tag(name=f'name{i}', content=f'content {i}') for i in range(tags)],
+        og_tags=[build_property(property=f'og:p{i}', content=f'content {i}') for i in range(tags)],
+        twitter_tags=[build_property(property=f'twitter:p{i}', content=f'content {i}') for i in range(tags)],
+    )
+
+
+def measure(build: Callable[[], list]) -> Tuple[float, int]:
+    ''' (seconds, bytes the result holds) for one call of `build`, timed without tracing '''
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del kept
+    return elapsed, size
+
+
+def main():
+    '''
+    python benchmarks/records.py -n 10000
+
+    builds the same data as the light records in core.records and as the
+    pydantic models in core.models, and prints construction time and the
+    memory the objects hold
+    '''
+    parser = argparse.ArgumentParser(description='compare record types with the pydantic models')
+    parser.add_argument('-n', type=int, help='keyword rows / meta tags per case', default=10_000)
+    args = parser.parse_args()
+
+    rows = keyword_rows(args.n)
+    tags = max(1, args.n // 3)
+
+    cases = [
+        (f'{args.n} keyword rows', lambda: [QueryRecord(**r) for r in rows], lambda: [models.QueryResult(**r) for r in rows]),
+        (f'{args.n} meta tags', lambda: [MetaTag(name=r['ph'], content=r['ur']) for r in rows],
+                                lambda: [models.MetaTag(name=r['ph'], content=r['ur']) for r in rows]),
+        (f'report, {tags * 3} tags', lambda: meta_report(MetaTag, PropertyTag, MetaReport, tags),
+                                     lambda: meta_report(models.MetaTag, models.PropertyTag, models.MetaReport, tags)),
+    ]
+
+    print(f"{'case':<24} {'record ms':>10} {'pydantic ms':>12} {'speedup':>8} {'record MB':>10} {'pydantic MB':>12}")
+    for name, record, model in cases:
+        record_time, record_size = measure(record)
+        model_time, model_size = measure(model)
+        print(f"{name:<24} {record_time * 1000:>10.1f} {model_time * 1000:>12.1f} {model_time / record_time:>7.1f}x"
+              f" {record_size / 2 ** 20:>10.2f} {model_size / 2 ** 20:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
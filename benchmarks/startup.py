@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imports that cost the most at startup, and the modes that have no use for them
+HEAVY = ('newspaper', 'nltk', 'textstat', 'bs4', 'lxml', 'pydantic', 'pyarrow', 'selectolax')
+
+MODES = {
+    'keywords': {'budget_ms': 600, 'unused': HEAVY},
+    'get_keyword': {'budget_ms': 500, 'unused': HEAVY},
+    'text': {'budget_ms': 3000, 'unused': ('pydantic', 'pyarrow')},
+}
+
+
+def _child(mode: str, base_url: str) -> None:
+    ''' one short job from a cold interpreter: a single row (or phrase) against the fixture server '''
+    start = time.perf_counter()
+
+    from benchmarks.fixtures import point_config_at
+    point_config_at(base_url)
+
+    os.chdir(tempfile.mkdtemp(prefix='batchfetch-startup-'))
+    os.makedirs('output_files')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'get_keyword':
+            import get_keyword
+            sys.argv = ['get_keyword.py', 'phrase number one']
+            get_keyword.main()
+        else:
+            import asyncio
+            import fetch
+
+            with open('input.csv', 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['location'])
+                writer.writerow(['phrase number one' if mode == 'keywords' else f'{base_url}/page/small/0'])
+
+            flags = ['-k'] if mode == 'keywords' else ['-w', '0']
+            sys.argv = ['fetch.py', 'input.csv', '--api_key', 'benchmark', '--no-api-cache', '-d', '0', *flags]
+            asyncio.run(fetch.run(fetch.parse_args()))
+
+    print(json.dumps({
+        'run_ms': (time.perf_counter() - start) * 1000,
+        'loaded': [m for m in HEAVY if m in sys.modules],
+    }))
+
+
+def measure(mode: str, base_url: str) -> Dict:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, base_url],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['wall_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main():
+    '''
+    python benchmarks/startup.py -n 5
+
+    times short jobs from a cold interpreter, the way a scheduler runs them:
+    a one row -k run, a one row text run and get_keyword.py, each against the
+    local fixture server. fails (exit 1) when a mode goes over its budget or
+    imports a heavy package it does not use, so it can guard CI.
+    '''
+    parser = argparse.ArgumentParser(description='cold start time per fetch.py mode')
+    parser.add_argument('-n', type=int, help='runs per mode, the median is reported', default=5)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--budget', nargs=2, action='append', metavar=('MODE', 'MS'), default=[],
+                        help='override a mode\'s budget in ms, e.g. --budget keywords 500')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(*args.child)
+
+    from benchmarks.fixtures import BenchServer
+
+    budgets = {mode: spec['budget_ms'] for mode, spec in MODES.items()}
+    budgets.update({mode: float(ms) for mode, ms in args.budget})
+
+    failures: List[str] = []
+
+    with BenchServer() as server:
+        print(f"{'mode':<14} {'wall ms':>9} {'run ms':>9} {'budget':>8}  heavy imports")
+
+        for mode in args.modes:
+            runs = [measure(mode, server.base_url) for _ in range(args.n)]
+            wall = median(r['wall_ms'] for r in runs)
+            run = median(r['run_ms'] for r in runs)
+            loaded = runs[-1]['loaded']
+            print(f"{mode:<14} {wall:>9.0f} {run:>9.0f} {budgets[mode]:>8.0f}  {', '.join(loaded) or '-'}")
+
+            if wall > budgets[mode]:
+                failures.append(f"{mode}: {wall:.0f}ms is over its {budgets[mode]:.0f}ms budget")
+            for module in sorted(set(loaded) & set(MODES[mode]['unused'])):
+                failures.append(f"{mode}: imports {module}, which it does not use")
+
+    for failure in failures:
+        print(failure)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class CachedResponse:
+    ''' the parts of requests.Response the query classes read, rebuilt from the cache '''
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = 200
+        self.ok = True
+        self.from_cache = True
+
+
+class QueryCache:
+    '''
+    persistent sqlite cache of API responses so the same query is only paid for once.
+    keyed on the request params (minus the api key) so a row repeated in a CSV,
+    or a re-run over the same sheet, is answered locally while it is younger than
+    `max_age` seconds.
+    usage:
+
+    cache = QueryCache('output_files/.api_cache.sqlite', max_age=30 * 86400)
+    q = SEMRushQuery(cache=cache).request('https://example.com/')
+    print(cache.stats())
+
+    '''
+
+    SECRET_PARAMS = ('key', 'token')
+
+    def __init__(self, path: str, max_age: float = 30 * 86400) -> None:
+        self.path = path
+        self.max_age = max_age
+
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                request TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        ''')
+        self._db.commit()
+
+    def cache_key(self, endpoint: str, params: Dict) -> str:
+        ''' normalized request: endpoint plus sorted params, credentials left out '''
+        clean = {k: str(v).strip() for k, v in params.items() if k not in self.SECRET_PARAMS and v is not None}
+
+        # keyword lookups are case insensitive, urls are not
+        if 'phrase' in clean:
+            clean['phrase'] = clean['phrase'].lower()
+
+        return json.dumps([endpoint, sorted(clean.items())])
+
+    def get(self, endpoint: str, params: Dict) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, stored_at FROM responses WHERE request = ?',
+                (self.cache_key(endpoint, params),)
+            ).fetchone()
+
+            if row and (time.time() - row[1]) < self.max_age:
+                self.hits += 1
+                return CachedResponse(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, endpoint: str, params: Dict, body: str) -> None:
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (request, body, stored_at) VALUES (?, ?, ?)',
+                (self.cache_key(endpoint, params), body, time.time())
+            )
+            self._db.commit()
+
+    def stats(self) -> str:
+        return f"API cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
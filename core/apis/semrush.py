@@ -1,29 +1,118 @@
 import csv
 import json
 from io import BytesIO
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote, unquote, urlencode, urlparse
 from urllib.request import urlopen
 
 import core.apis.config as config
-import requests
 from core.apis import AbstractQuery
-from pydantic import BaseModel, HttpUrl
+from core.apis.cache import QueryCache
+from core.ratelimit import limiter
+from core.records import QueryRecord
+from core.session import get_session
 
 
-class QueryResult(BaseModel):
-    ph: str
-    po: int
-    pd: Optional[str]
-    tr: float
-    nq: int
-    et: int
-    ur: HttpUrl
-    td: Optional[str]
+RECORD_FIELDS = ('ph', 'po', 'pd', 'tr', 'nq', 'et', 'ur', 'td')
+
+# share of a keyword's searches that click through, by position (index 0 is unranked)
+CTR_BY_POSITION = (0, .3844, .1907, .1134, .077, .0546,
+                   .0409, .0315, .0249, .0199, .0171,
+                   .0177, .0192, .0192, .0188, .0189,
+                   .0173, .0163, .0152, .0142, .0131)
+
+
+def _cells(column: Tuple[str, ...]) -> List[str]:
+    ''' unescape a column of export_escape cells: strip the quotes, url-decode only where needed '''
+    return [unquote(v, errors="replace")[1:-1] if '%' in v else v[1:-1] for v in column]
+
+
+def _typed(column: List[str], cast) -> List[Any]:
+    ''' cast a column, with None wherever a cell does not convert '''
+    try:
+        return list(map(cast, column))
+    except ValueError:
+        pass
+
+    typed = []
+    for v in column:
+        try:
+            typed.append(cast(v))
+        except ValueError:
+            typed.append(None)
+    return typed
+
+
+def parse_organic(text: str, url: str = None, header_keys: Dict[str, str] = None) -> Dict[str, list]:
+    '''
+    parse a url_organic answer column by column instead of cell by cell.
+    `header_keys` maps answer column names to short keys. po, tr, nq are
+    converted and et (estimated monthly traffic) comes from a CTR lookup by
+    position; rows with a position, volume or traffic share that does not
+    convert are dropped.
+    '''
+    header_keys = header_keys or {}
+    columns = {f: [] for f in RECORD_FIELDS}
+    if text.startswith("ERROR"):
+        return columns
+
+    lines = text.split("\r\n")
+    headers = [header_keys.get(h, h) for h in lines[0].split(";")]
+    rows = [r for r in (line.split(";") for line in lines[1:]) if len(r) == len(headers)]
+    if not rows:
+        return columns
+
+    raw = {h: _cells(column) for h, column in zip(headers, zip(*rows))}
+    count = len(rows)
+
+    po = _typed(raw.get('po', [''] * count), int)
+    nq = _typed(raw.get('nq', [''] * count), int)
+    tr = _typed(raw.get('tr', [''] * count), float)
+    top = len(CTR_BY_POSITION)
+    et = [round(CTR_BY_POSITION[p] * q) if p is not None and q and 0 < p < top else 0 for p, q in zip(po, nq)]
+
+    keep = [i for i in range(count) if po[i] is not None and nq[i] is not None and tr[i] is not None]
+    if len(keep) < count:
+        pick = lambda column: [column[i] for i in keep]
+    else:
+        pick = lambda column: column
+
+    columns.update(
+        ph=pick(raw.get('ph', [''] * count)),
+        po=pick(po),
+        pd=pick(raw.get('pd', [None] * count)),
+        tr=pick(tr),
+        nq=pick(nq),
+        et=pick(et),
+        ur=pick(raw.get('ur', [url] * count)),
+        td=pick(raw.get('td', [None] * count)),
+    )
+    return columns
+
+
+def __getattr__(name: str):
+    # the pydantic model used to live here; it is imported on first use so pydantic stays off the -k startup path
+    if name == 'QueryResult':
+        from core.models import QueryResult
+        return QueryResult
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def normalize_phrase(phrase: str) -> str:
+    ''' match a phrase to SEMRush's echo of it: unescaped, lowercase, single spaced '''
+    return ' '.join(unquote(phrase).strip('"').lower().split())
 
 
 class SEMRushQuery(AbstractQuery):
-    def __init__(self, key=None):
+    # phrase_these accepts up to 100 phrases per call
+    MAX_BATCH_PHRASES = 100
+    # api quota, requests per second; shared by every instance and thread
+    RATE_LIMIT = 10
+
+    def __init__(self, key=None, cache: QueryCache = None):
+        self.cache = cache
+        self._volume_rows: Dict[str, Optional[Dict[str, str]]] = {}
         self.url = None
         self.domain = None
         self.query_type = 'url_organic'
@@ -46,7 +135,15 @@ class SEMRushQuery(AbstractQuery):
             ('ur','Url'),
             ('td','Trends')
         ]
+        # column name in the answer -> short key
+        self._header_keys = {name: key for key, name in self._headers}
+        self._parsed = None
     
+    @staticmethod
+    def column_types():
+        ''' the numeric fields of a keyword row, from QueryRecord '''
+        return {f: t for f, t in QueryRecord.__annotations__.items() if t in (int, float)}
+
     @staticmethod
     def headers():
         return [
@@ -125,72 +222,129 @@ class SEMRushQuery(AbstractQuery):
         self.row_limit = min(limit, 10000)
         self.sort_by = 'tr_desc'
 
-        args = urlencode(self.args(), safe=',', quote_via=quote)
-        self.request_uri = f"{config.SEMRUSH_ENDPOINT}/?{args}"
-
-        self.response = requests.get(self.request_uri)
+        self._get(self.args())
         return self
     
-    def request_volume(self, phrase, se='us'):
-        args = {
-            'type': 'phrase_this',
+    def _volume_args(self, phrase, report='phrase_this'):
+        return {
+            'type': report,
             'phrase': phrase,
             'key': self.key,
             'database': self.database,
             'export_escape': 1,
             'export_columns': ','.join(['Ph', 'Nq', 'Td'])
         }
-        args = urlencode(args, safe=',', quote_via=quote)
-        self.request_uri = f"{config.SEMRUSH_ENDPOINT}/?{args}"
-        self.response = requests.get(self.request_uri)
+
+    def request_volume(self, phrase, se='us'):
+        self._get(self._volume_args(phrase))
         
         return self
 
-    @property
-    def results(self) -> List[QueryResult]:
-        if self.response.text.startswith("ERROR"):
-            return []
-        else:
-            # print(self.response.text)
+    def request_volumes(self, phrases: List[str], se='us'):
+        """
+        Volumes for many phrases in phrase_these calls of up to 100 phrases
+        (separated by ;) instead of one phrase_this call each.
+        Read a phrase's row back with keyword_results(phrase)
+        """
+        self._volume_rows = {}
+        misses = []
+
+        for phrase in phrases:
+            key = normalize_phrase(phrase)
+            if key in self._volume_rows:
+                continue
+
+            if ';' in phrase:
+                # can't be sent in a ; separated batch
+                self.request_volume(phrase)
+                self._volume_rows[key] = self.keyword_results()
+            elif self.cache and (cached := self.cache.get(config.SEMRUSH_ENDPOINT, self._volume_args(phrase))):
+                self.response = cached
+                self._volume_rows[key] = self.keyword_results()
+            else:
+                self._volume_rows[key] = None
+                misses.append(phrase)
+
+        for start in range(0, len(misses), self.MAX_BATCH_PHRASES):
+            batch = misses[start:start + self.MAX_BATCH_PHRASES]
+            self._get(self._volume_args(';'.join(batch), report='phrase_these'), use_cache=False)
+
+            # "nothing found" for the whole batch, or an error: nothing to match or cache
+            if self.response.text.startswith("ERROR"):
+                continue
+
             rows = self.response.text.split("\r\n")
-            headers = [h for h in rows.pop(0).split(";")]
-            keywords = []
+            header = rows.pop(0)
+            headers = header.split(";")
+            raw_rows = {}
 
             for r in rows:
-                row = r.split(";")
-                if len(row) is not len(headers):
+                values = r.split(";")
+                if len(values) != len(headers):
                     continue
 
-                data = {}
-                data['ur'] = self.url
+                key = normalize_phrase(values[0])
+                self._volume_rows[key] = dict(zip(headers, values))
+                raw_rows[key] = r
+
+            for phrase in batch:
+                r = raw_rows.get(normalize_phrase(phrase))
+                if r:
+                    # store it as its own phrase_this answer so single lookups hit too
+                    if self.cache:
+                        self.cache.put(config.SEMRUSH_ENDPOINT, self._volume_args(phrase), f"{header}\r\n{r}")
+                else:
+                    # left out of the answer, or echoed in a form that doesn't match: ask for it alone
+                    self.request_volume(phrase)
+                    self._volume_rows[normalize_phrase(phrase)] = self.keyword_results()
+
+        return self
 
-                for i, h in enumerate(headers):
-                    data[self.unmap(h)] = unquote(
-                        row[i],
-                        errors="replace"
-                    )[1:-1]
+    def _get(self, params, use_cache=True):
+        ''' request `params`, answering from the cache when it holds a fresh copy '''
+        args = urlencode(params, safe=',', quote_via=quote)
+        self.request_uri = f"{config.SEMRUSH_ENDPOINT}/?{args}"
+        cache = self.cache if use_cache else None
 
-                if all([data.get('po'), data.get('nq')]):
-                    ctrs = [.3844, .1907, .1134, .077, .0546,
-                            .0409, .0315, .0249, .0199, .0171,
-                            .0177, .0192, .0192, .0188, .0189,
-                            .0173, .0163, .0152, .0142, .0131]
+        if cache and (cached := cache.get(config.SEMRUSH_ENDPOINT, params)):
+            self.response = cached
+            return
 
-                    try:
-                        data['et'] = round(
-                            ctrs[int(data.get('po'))-1] * int(data.get('nq'))
-                        )
-                    except IndexError:
-                        data['et'] = 0
+        limiter('semrush', self.RATE_LIMIT).acquire()
+        self.response = get_session().get(self.request_uri)
 
-                else:
-                    data['et'] = 0
+        # "nothing found" is a real answer; other errors (units, auth) are not cached
+        text = self.response.text
+        if cache and self.response.ok and (not text.startswith("ERROR") or text.startswith("ERROR 50 ::")):
+            cache.put(config.SEMRUSH_ENDPOINT, params, text)
 
-                keywords.append(data)
+    @property
+    def result_columns(self) -> Dict[str, list]:
+        '''
+        the url_organic answer as typed columns (ph, po, pd, tr, nq, et, ur, td),
+        parsed once per response
+        '''
+        if self._parsed is None or self._parsed[0] is not self.response:
+            self._parsed = (self.response, parse_organic(self.response.text, self.url, self._header_keys))
 
-            return [QueryResult(**k) for k in keywords]
+        return self._parsed[1]
+
+    @property
+    def results(self) -> List[QueryRecord]:
+        ''' one QueryRecord per keyword row, see validated_results for pydantic models '''
+        columns = self.result_columns
+        return [QueryRecord(*row) for row in zip(*(columns[f] for f in RECORD_FIELDS))]
+
+    @property
+    def validated_results(self) -> list:
+        ''' the results as pydantic QueryResult models (core.models), checked field by field '''
+        return [r.validate() for r in self.results]
+
+    def keyword_results(self, phrase=None):
+        if phrase is not None:
+            # one row of a request_volumes batch
+            return self._volume_rows.get(normalize_phrase(phrase))
 
-    def keyword_results(self):
         if self.response.text.startswith("ERROR"):
             return None
         else:
@@ -201,17 +355,7 @@ class SEMRushQuery(AbstractQuery):
             return dict(zip(headers, values))
 
     def unmap(self, header):
-        map = { h[1]: h[0] for h in self._headers}
-
-        try:
-            return map[header]
-        except IndexError:
-            return header
+        return self._header_keys.get(header, header)
     
     def remap(self, header):
-        map = { h[0]: h[1] for h in self._headers}
-
-        try:
-            return map[header]
-        except IndexError:
-            return header
+        return dict(self._headers).get(header, header)
@@ -1,15 +1,14 @@
 import argparse
 import csv
 import json
-import time
-from datetime import datetime
 from io import BytesIO
 from urllib.parse import quote, unquote, urlencode, urlparse
 from urllib.request import urlopen
 
 import core.apis.config as config
-import requests
 from core.apis import AbstractQuery
+from core.ratelimit import limiter
+from core.session import get_session
 
 
 class SERPStatQuery(AbstractQuery):
@@ -21,8 +20,7 @@ class SERPStatQuery(AbstractQuery):
         self.se = None
 
         self.limit_requests = True
-        self.rps = 1  #requests per second
-        self.lr = datetime.now()  #last request
+        self.rps = 1  #requests per second, shared by every instance and thread
         
         self._filters = {
             'position_from': 1,
@@ -116,10 +114,7 @@ class SERPStatQuery(AbstractQuery):
 
     def sleep_if_needed(self):
         if self.limit_requests:
-            et = (datetime.now() - self.lr).total_seconds()
-            if et < (1/self.rps):
-                break_time = (1/self.rps) - et
-                time.sleep(break_time)
+            limiter('serpstat', self.rps).acquire()
     
     def request(self, query, limit=25, method='url_keywords', se='g_us'):
         """
@@ -137,8 +132,7 @@ class SERPStatQuery(AbstractQuery):
         
         self.sleep_if_needed() # api speed limits
         
-        self.response = requests.get(self.request_uri)
-        self.lr = datetime.now()
+        self.response = get_session().get(self.request_uri)
 
         return self
     
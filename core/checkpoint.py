@@ -0,0 +1,121 @@
+import csv
+import os
+from typing import List, Set, Tuple
+
+
+class Checkpoint:
+    '''
+    a journal of finished input rows, kept next to the output file as
+    `<output>.journal` so an interrupted run can be resumed.
+
+    every finished row is marked with its index and key value, plus how many
+    rows it wrote to the output and keyword files. marks are only trusted once
+    a commit line follows them; a commit records the size of each output file
+    right after a flush, so a resumed run can cut off anything half written.
+    usage:
+
+    checkpoint = Checkpoint('output_files/run.csv')
+    done = checkpoint.restore('output_files/run.csv')   # when resuming
+
+    checkpoint.mark(0, 'https://example.com/', rows=1)
+    checkpoint.commit(builder.output_size)
+    checkpoint.close()
+
+    '''
+
+    COMMIT = '@'
+
+    def __init__(self, output_file_path: str) -> None:
+        self.journal_path = f'{output_file_path}.journal'
+        self._pending: List[Tuple[int, str, int, int]] = []
+        self._journal = None
+        self._writer = None
+
+    @staticmethod
+    def exists(output_file_path: str) -> bool:
+        return os.path.exists(f'{output_file_path}.journal')
+
+    def entries(self) -> List[Tuple[int, str, int, int]]:
+        ''' committed (index, key, rows, keyword rows) marks in journal order '''
+        return self._read()[0]
+
+    def sizes(self) -> List[int]:
+        ''' the output file sizes recorded by the last commit '''
+        return self._read()[1]
+
+    def _read(self) -> Tuple[List[Tuple[int, str, int, int]], List[int]]:
+        committed, pending, sizes = [], [], []
+
+        if not os.path.exists(self.journal_path):
+            return committed, sizes
+
+        with open(self.journal_path, encoding='utf-8', newline='') as journal:
+            for line in csv.reader(journal):
+                if not line:
+                    continue
+
+                if line[0] == self.COMMIT:
+                    try:
+                        sizes = [int(s) for s in line[1:]]
+                    except ValueError:
+                        break
+                    committed.extend(pending)
+                    pending = []
+                    continue
+
+                try:
+                    index, key, rows, keyword_rows = line
+                    pending.append((int(index), key, int(rows), int(keyword_rows)))
+                except ValueError:
+                    # a torn last line from a crash; nothing after it was committed
+                    break
+
+        return committed, sizes
+
+    def restore(self, *output_file_paths: str) -> Set[Tuple[int, str]]:
+        '''
+        truncate each output file to its last committed size and
+        return the (index, key) pairs that are already finished
+        '''
+        committed, sizes = self._read()
+
+        # nothing was ever committed: start the files over
+        sizes = sizes or [0] * len(output_file_paths)
+
+        for path, size in zip(output_file_paths, sizes):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+        # rewrite the journal without any uncommitted tail
+        with open(self.journal_path, 'w', encoding='utf-8', newline='') as journal:
+            writer = csv.writer(journal)
+            if committed:
+                writer.writerows(committed)
+                writer.writerow([self.COMMIT, *sizes])
+
+        return {(index, key) for index, key, _, _ in committed}
+
+    def mark(self, index: int, key: str, rows: int = 1, keyword_rows: int = 0) -> None:
+        ''' record a finished row; written to the journal on the next commit '''
+        self._pending.append((index, key, rows, keyword_rows))
+
+    def commit(self, *output_sizes: int) -> None:
+        ''' journal pending marks together with the current output file sizes '''
+        if not self._pending:
+            return
+
+        if self._writer is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._journal)
+
+        self._writer.writerows(self._pending)
+        self._writer.writerow([self.COMMIT, *output_sizes])
+        self._journal.flush()
+        self._pending = []
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._writer = None
@@ -1,6 +1,10 @@
-import csv
-from io import TextIOWrapper
-from typing import Dict, List
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from core.csv_input import CSVInput
+from core.metrics import metrics
+from core.sinks import Sink, open_sink
 
 
 class CSVBuilder:
@@ -10,86 +14,139 @@ class CSVBuilder:
     usage:
 
     builder = CSVBuilder('~/input.csv', '~/output.csv')
-    builder.add_headers(['new column 1', 'new column 2'])
+    builder.add_headers(['new column 1', 'new column 2'], types={'new column 2': int})
 
     with builder:
-        for row in builder.input_reader:
+        for i, row in builder.rows(start=0):
             new_data = {
                 'new column 1': 'new data for col 1',
                 'new column 2': 'new data for col 2'
             }
             builder.append_data(row, new_data)
     
+    the output file stays open for the whole `with` block and rows are
+    buffered, then written every `flush_rows` rows or `flush_seconds` seconds,
+    whichever comes first. leaving the block (even on an exception) flushes
+    whatever is still buffered. callables in `flush_hooks` run after every
+    flush, once the rows are on disk.
+
+    the input is read with CSVInput: opened once, header read once, and
+    rows(start) seeks to a row through its cached offset index.
+
+    with append=True an existing output file is continued instead of
+    replaced and its header is not written again.
+
+    the output does not have to be CSV: `output_format` (or the output
+    file's extension) picks a sink from core.sinks, so the same rows can go
+    to JSONL, Parquet or Arrow with their numbers kept as numbers. `types`
+    given to add_headers tell those formats what a column holds up front,
+    so a first batch of failed rows can't decide it.
     '''
 
 
-    def __init__(self, input_file_path, output_file_path, input_encoding='utf-8-sig', output_encoding='utf-8') -> None:
+    def __init__(self, input_file_path, output_file_path, input_encoding='utf-8-sig', output_encoding='utf-8',
+                 flush_rows: int = 100, flush_seconds: float = 5.0, append: bool = False, output_format: str = None) -> None:
         self.output_file_path = output_file_path
         self.output_encoding = output_encoding
+        self.output_format = output_format
+        self.append = append
 
         self.output_created: bool = False
+        self.output: Sink = None
+
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._types: Dict[str, type] = {}
+        self._buffer: List[Dict[str, str]] = []
+        self._last_flush = time.monotonic()
+        self.flush_hooks: List[Callable[[], None]] = []
 
         self.input_file_path = input_file_path
         self.input_encoding = input_encoding
 
-        self.input_file: TextIOWrapper = None
-        self.input_reader: csv.DictReader = None
-
-        self._headers: List[str] = None
-        with open(self.input_file_path, encoding=self.input_encoding, mode="r") as input_file:
-            self.input_reader = csv.DictReader(input_file)
-            self._headers = self.input_reader.fieldnames or []
+        self.input_reader = CSVInput(self.input_file_path, encoding=self.input_encoding)
+        self._headers: List[str] = list(self.input_reader.fieldnames)
 
 
     def __enter__(self):
         print("--- Entering `With` Mode ---")
-        self.input_file = open(self.input_file_path, encoding=self.input_encoding, mode="r")
-        self.input_reader = csv.DictReader(self.input_file)
+        return self
     
     def __exit__(self, *exc):
         print("--- Closing Input File ---")
-        self.input_file.close()
+        try:
+            self.close_output()
+        finally:
+            self.input_reader.close()
+
+    def rows(self, start: int = 0) -> Iterator[Tuple[int, Dict[str, str]]]:
+        ''' (index, row) for every input row from index `start` on '''
+        return self.input_reader.rows(start)
         
-    def add_headers(self, headers: List[str]) -> None:
+    def add_headers(self, headers: List[str], types: Dict[str, type] = None) -> None:
         if type(headers) is not list:
             raise ValueError("Must supply a list")
 
         self._headers.extend([h for h in headers if h not in self._headers])
+        self._types.update(types or {})
     
     def create_output_file(self) -> bool:
-        ''' create the output file with all added headers and return status of creation'''
+        ''' create the output file with all added headers, keep it open and return status of creation'''
         if not self._headers:
             print("No headers for output")
             return False
 
-        try:
-            with open(self.output_file_path, 'w', encoding=self.output_encoding) as output_file:
-                output_writer = csv.DictWriter(output_file, self._headers, extrasaction="ignore")
-                output_writer.writeheader()
-                self.output_created = True
-            
-            return self.output_created
-        except FileExistsError:
-            print("File already Exists")
-            return False
-        finally:
-            return False
+        self.output = open_sink(self.output_file_path, self._headers, format=self.output_format,
+                                append=self.append, encoding=self.output_encoding, types=self._types)
+        self.output_created = True
+
+        return self.output_created
 
     def append_data(self, row: Dict[str, str], new_data: Dict[str, str], escape_new_lines=True) -> None:
         if not self.output_created:
             self.create_output_file()
             
-        if escape_new_lines:
+        # typed sinks keep values (and newlines) as they are
+        if escape_new_lines and (self.output is None or self.output.escape_new_lines):
             escaped_data = {}
             for k, v in new_data.items():
-                escaped_data[k] = str(v).replace('\r\n', '\n').replace('\n', '\\n')
+                # None (a failed column) is left for the writer, which writes it as an empty cell
+                escaped_data[k] = v if v is None else str(v).replace('\r\n', '\n').replace('\n', '\\n')
             
             new_data = escaped_data
 
         row.update(new_data)
-        
-        with open(self.output_file_path, 'a', encoding=self.output_encoding) as output_file:
-            output_writer = csv.DictWriter(output_file, self._headers, extrasaction="ignore")
-            output_writer.writerow(row)
+        self._buffer.append(row)
+
+        if len(self._buffer) >= self.flush_rows or (time.monotonic() - self._last_flush) >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        ''' write buffered rows to the output file '''
+        if self._buffer and self.output:
+            with metrics.timer('write'):
+                self.output.write(self._buffer)
+                self.output.flush()
 
+        self._buffer = []
+        self._last_flush = time.monotonic()
 
+        for hook in self.flush_hooks:
+            hook()
+
+    @property
+    def output_size(self) -> int:
+        ''' bytes written to the output file so far '''
+        if self.output:
+            return self.output.tell()
+
+        return os.path.getsize(self.output_file_path) if os.path.exists(self.output_file_path) else 0
+
+    def close_output(self) -> None:
+        ''' flush remaining rows and close the output file '''
+        try:
+            self.flush()
+        finally:
+            if self.output is not None:
+                self.output.close()
+                self.output = None
@@ -0,0 +1,185 @@
+import codecs
+import csv
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+
+class CSVInput:
+    '''
+    streaming reader for the input CSV. the file is opened once, the header is
+    read once, and rows are handed out as dicts (the same rows csv.DictReader
+    gives, blank lines skipped) together with their index.
+
+    jumping to a row uses a sparse byte offset index: the offset of every
+    `index_every`th row is recorded while rows are read and saved next to
+    the input as `<input>.rowidx`. later runs seek straight to the nearest
+    indexed row instead of parsing everything before it. the index is thrown
+    away if the input's size or modification time changes.
+
+    lines end at \n, \r\n or a lone \r, as in text mode. encodings whose
+    newlines aren't single ASCII bytes (utf-16, utf-32) can't be split or
+    seeked in bytes, so they are read in text mode without an index.
+    usage:
+
+    with CSVInput('~/input.csv') as reader:
+        reader.fieldnames
+        for i, row in reader.rows(start=900_000):
+            ...
+
+    '''
+
+    INDEX_SUFFIX = '.rowidx'
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, path: str, encoding: str = 'utf-8-sig', index_every: int = 1000) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.index_every = max(1, index_every)
+        self.index_path = f'{path}{self.INDEX_SUFFIX}'
+        self.indexed = self.ascii_compatible(encoding)
+
+        stat = os.stat(path)
+        self._signature = [stat.st_size, stat.st_mtime_ns, self.index_every]
+        self._offsets: List[int] = self._load_index() if self.indexed else []
+        self._index_changed = False
+
+        if not self.indexed:
+            self._file = open(path, encoding=encoding, newline='')
+            header = next(csv.reader(self._file), None)
+            self.fieldnames: List[str] = header or []
+            return
+
+        self._file = open(path, 'rb')
+        self._pos = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+
+        header = next(csv.reader(self._lines()), None)
+        self.fieldnames: List[str] = header or []
+        self._data_start = self._pos
+
+        if not self._offsets:
+            self._offsets = [self._data_start]
+
+    def __enter__(self) -> 'CSVInput':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for _, row in self.rows():
+            yield row
+
+    @staticmethod
+    def ascii_compatible(encoding: str) -> bool:
+        ''' can lines of this encoding be split, and seeked to, as bytes '''
+        try:
+            return b'\r\n,"'.decode(encoding) == '\r\n,"'
+        except UnicodeDecodeError:
+            return False
+
+    def _lines(self) -> Iterator[str]:
+        '''
+        decoded lines from the current position, keeping track of the byte offset.
+        split like text mode's universal newlines; iterating a binary file only splits on \n
+        '''
+        pending = b''
+        while chunk := self._file.read(self.READ_SIZE):
+            lines = (pending + chunk).splitlines(keepends=True)
+            # the last line may go on in the next chunk, or be the \r of a \r\n
+            pending = lines.pop()
+            for line in lines:
+                self._pos += len(line)
+                yield self._decoder.decode(line)
+
+        if pending:
+            self._pos += len(pending)
+            yield self._decoder.decode(pending, final=True)
+
+    def _seek(self, offset: int) -> None:
+        self._file.seek(offset)
+        self._pos = offset
+        self._decoder.reset()
+
+    def _load_index(self) -> List[int]:
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return []
+
+        if index.get('signature') != self._signature:
+            return []
+
+        return index.get('offsets', [])
+
+    def _save_index(self) -> None:
+        tmp = f'{self.index_path}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'signature': self._signature, 'offsets': self._offsets}, f)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass  # the index only saves time, a read-only input directory is fine
+
+        self._index_changed = False
+
+    def _row(self, values: List[str]) -> Dict[str, str]:
+        ''' the same dict csv.DictReader builds for a record '''
+        row = dict(zip(self.fieldnames, values))
+        if len(values) > len(self.fieldnames):
+            row[None] = values[len(self.fieldnames):]
+        elif len(values) < len(self.fieldnames):
+            for key in self.fieldnames[len(values):]:
+                row[key] = None
+
+        return row
+
+    def rows(self, start: int = 0) -> Iterator[Tuple[int, Dict[str, str]]]:
+        ''' yield (index, row) for every row from index `start` on '''
+        if not self.indexed:
+            yield from self._text_rows(start)
+            return
+
+        block = min(start // self.index_every, len(self._offsets) - 1)
+        i = block * self.index_every
+        self._seek(self._offsets[block])
+
+        record_start = self._pos
+        for values in csv.reader(self._lines()):
+            if values:
+                if i % self.index_every == 0 and i // self.index_every == len(self._offsets):
+                    self._offsets.append(record_start)
+                    self._index_changed = True
+
+                if i >= start:
+                    yield i, self._row(values)
+
+                i += 1
+
+            # csv.reader only takes the lines of one record at a time
+            record_start = self._pos
+
+        # the end of the file was reached, so every offset is known
+        if self._index_changed:
+            self._save_index()
+
+    def _text_rows(self, start: int) -> Iterator[Tuple[int, Dict[str, str]]]:
+        ''' rows without an index: read from the top, the rows before `start` are parsed and skipped '''
+        self._file.seek(0)
+        records = csv.reader(self._file)
+        next(records, None)
+
+        i = 0
+        for values in records:
+            if values:
+                if i >= start:
+                    yield i, self._row(values)
+                i += 1
+
+    def close(self) -> None:
+        if self._index_changed:
+            self._save_index()
+
+        self._file.close()
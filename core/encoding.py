@@ -0,0 +1,117 @@
+import codecs
+import re
+from typing import Iterable, Iterator, Mapping, Optional, Tuple
+
+from requests.compat import chardet
+
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# labels browsers treat as windows-1252, which is a superset of them
+WINDOWS_1252_LABELS = {'iso-8859-1', 'iso8859-1', 'latin-1', 'latin1', 'us-ascii', 'ascii'}
+
+CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+SNIFF_BYTES = 4096
+DETECT_BYTES = 64 * 1024
+
+
+def _codec(label: Optional[str]) -> Optional[str]:
+    ''' python codec name for a charset label, or None if python does not know it '''
+    if not label:
+        return None
+
+    label = label.strip().lower()
+    if label in WINDOWS_1252_LABELS:
+        return 'cp1252'
+
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def header_encoding(headers: Mapping[str, str]) -> Optional[str]:
+    ''' charset declared in the Content-Type header '''
+    match = CONTENT_TYPE_CHARSET.search(headers.get('content-type', ''))
+    return _codec(match.group(1)) if match else None
+
+
+def declared_encoding(headers: Mapping[str, str], body: bytes) -> Optional[str]:
+    '''
+    encoding the response states itself: a byte order mark, the Content-Type
+    charset, or a <meta charset> / http-equiv tag in the first 4KB
+    '''
+    for bom, name in BOMS:
+        if body.startswith(bom):
+            return name
+
+    if encoding := header_encoding(headers):
+        return encoding
+
+    if match := META_CHARSET.search(body[:SNIFF_BYTES]):
+        if encoding := _codec(match.group(1).decode('ascii', 'ignore')):
+            # a document can't be utf-16 if its ascii meta tag was readable
+            return 'utf-8' if encoding.startswith('utf-16') else encoding
+
+    return None
+
+
+def decode_html(headers: Mapping[str, str], body: bytes) -> Tuple[str, str]:
+    '''
+    (text, encoding) for an html response, decoded exactly once.
+    a declared encoding wins; otherwise strict utf-8 is tried, and only if that
+    fails is the encoding guessed statistically from the first 64KB.
+    '''
+    if encoding := declared_encoding(headers, body):
+        return body.decode(encoding, 'replace'), encoding
+
+    try:
+        return body.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    encoding = _codec(chardet.detect(body[:DETECT_BYTES])['encoding']) or 'cp1252'
+    return body.decode(encoding, 'replace'), encoding
+
+
+def decode_chunks(headers: Mapping[str, str], chunks: Iterable[bytes]) -> Iterator[str]:
+    '''
+    decode a streamed html body as it arrives. the encoding is worked out
+    like decode_html does, but from the start of the body only, since the
+    rest may never be read: the first 4KB, or 64KB when the charset has to
+    be guessed
+    '''
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+
+    encoding = declared_encoding(headers, head)
+    if encoding is None:
+        try:
+            # a multi-byte character may be cut off at the end, that is fine
+            codecs.getincrementaldecoder('utf-8')().decode(head)
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            # chardet needs more text than that to be reliable
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= DETECT_BYTES:
+                    break
+            encoding = _codec(chardet.detect(head[:DETECT_BYTES])['encoding']) or 'cp1252'
+
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    yield decoder.decode(head)
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
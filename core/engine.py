@@ -0,0 +1,146 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable
+
+from core.metrics import metrics
+from core.page import Page
+from core.page_cache import PageCache
+from core.ratelimit import host_limiter
+
+
+class FetchEngine:
+    '''
+    run many rows at once while keeping results in input order.
+    blocking work (requests, parsing) runs on a thread pool, network calls
+    are throttled per host with `delay` seconds between hits on the same origin
+    (a shared token bucket per host, see core.ratelimit).
+    CPU heavy work (newspaper nlp, readability scores) goes to a pool of `workers`
+    processes; with workers=0 it stays on the thread pool. `initializer`
+    runs in each pool worker, or once in this process when workers=0, to load
+    what the CPU work needs before the first row arrives.
+    usage:
+
+    engine = FetchEngine(concurrency=8, delay=1.5, workers=4)
+
+    async def worker(uri):
+        page = await engine.fetch_page(uri)
+        return page.status_code
+
+    async for status in engine.map(uris, worker):
+        print(status)
+
+    '''
+
+    def __init__(self, concurrency: int = 8, delay: float = 1.5, workers: int = 0, cache: PageCache = None,
+                 initializer: Callable[[], None] = None) -> None:
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.host_rate = 1 / delay if delay > 0 else 0
+        self.threads = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.workers = workers
+        self.initializer = initializer
+        self.processes = self._start_processes() if workers > 0 else None
+
+        if self.processes is None and initializer is not None:
+            initializer()
+
+        # enough rows in flight to keep both the fetchers and the workers busy
+        self.window = max(self.concurrency, workers) * 2
+
+    def _start_processes(self) -> ProcessPoolExecutor:
+        processes = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+
+        if self.initializer is not None:
+            # start every worker now, so they warm up while the first pages download
+            for _ in range(self.workers):
+                processes.submit(int)
+
+        return processes
+
+    async def run_blocking(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        ''' run a blocking callable on the engine's thread pool '''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.threads, partial(fn, *args, **kwargs))
+
+    async def run_cpu(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        '''
+        run a picklable, module level callable on the process pool.
+        a worker that dies (OOM, segfault on a bad page) breaks the whole
+        pool and every call in flight on it; the pool is then replaced and
+        each of those calls is retried once, so only the row that keeps
+        killing workers fails
+        '''
+        if self.processes is None:
+            return await self.run_blocking(fn, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            processes = self.processes
+            try:
+                return await loop.run_in_executor(processes, partial(fn, *args, **kwargs))
+            except BrokenProcessPool:
+                # the calls that broke together all land here, replace the pool once
+                if self.processes is processes:
+                    print("    ... A worker process died, restarting the process pool")
+                    processes.shutdown(wait=False)
+                    self.processes = self._start_processes()
+
+                if attempt:
+                    raise
+
+    async def call(self, url: str, fn: Callable[..., Any], *args,
+                   stage: str = 'request', row: Dict[str, float] = None, **kwargs) -> Any:
+        '''
+        run a blocking network call once the host of `url` is free.
+        the wait is timed as 'delay' and the call itself as `stage`;
+        `row` collects this row's stage timings (see core.metrics)
+        '''
+        wait = await host_limiter(url, self.host_rate).acquire_async()
+        metrics.record('delay', wait, row)
+
+        with metrics.timer(stage, row):
+            return await self.run_blocking(fn, *args, **kwargs)
+
+    async def fetch_page(self, url: str, row: Dict[str, float] = None, **kwargs) -> Page:
+        if self.cache is not None:
+            # fresh cache hits never touch the origin, so they skip the throttle
+            with metrics.timer('cache', row):
+                page, stale = await self.run_blocking(Page.lookup, url, self.cache)
+            if page:
+                return page
+
+            # a stale copy is revalidated from what was just read
+            kwargs['cached'] = stale
+
+        return await self.call(url, Page.fetch, url, cache=self.cache, stage='download', row=row, **kwargs)
+
+    async def map(self, items: Iterable[Any], worker: Callable[[Any], Awaitable[Any]]) -> AsyncIterator[Any]:
+        '''
+        yield `await worker(item)` for every item, in input order.
+        a bounded window of rows is in flight so that slow rows do not
+        stall the others and memory stays flat on very large inputs.
+        '''
+        pending = deque()
+
+        try:
+            for item in items:
+                pending.append(asyncio.ensure_future(worker(item)))
+
+                while len(pending) >= self.window:
+                    yield await pending.popleft()
+
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # a row raised or the run was stopped, rows still in flight are abandoned
+            for task in pending:
+                task.cancel()
+
+    def close(self) -> None:
+        # after an error or Ctrl-C, rows that haven't started yet are dropped rather than run
+        self.threads.shutdown(wait=True, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.shutdown(wait=True, cancel_futures=True)
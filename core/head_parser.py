@@ -0,0 +1,127 @@
+from typing import Dict, Iterable, Optional, Union
+
+from lxml import etree
+
+
+def _string(el) -> Optional[str]:
+    '''
+    the same value BeautifulSoup's `tag.string` gives for an element.
+    comments count as children there too, and a lone comment is the string
+    '''
+    children = list(el)
+    if not children:
+        return el.text
+    if len(children) == 1 and not el.text and not children[0].tail:
+        if isinstance(children[0], etree._Comment):
+            return children[0].text
+        return _string(children[0])
+    return None
+
+
+class HeadScanner:
+    '''
+    incremental parse for the HTMLReader.csv_report fields: titles and meta tags
+    in <head> plus the first <h1>. the document is fed in chunks and parsing
+    stops as soon as those fields are known, so neither the rest of the body
+    nor a full tree is ever needed.
+    usage:
+
+    scanner = HeadScanner()
+    for chunk in response.iter_content(16384):
+        if scanner.feed(chunk):
+            break
+    scanner.close()
+    scanner.meta['titles']
+
+    `meta` has the same keys as HTMLReader._scan() but holds raw, uncleaned
+    strings; `h1s` has at most one entry and `itemscopes` is always empty.
+    '''
+
+    def __init__(self, encoding: str = None) -> None:
+        self.parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+        self.meta: Dict[str, list] = {
+            'titles': [],
+            'h1s': [],
+            'meta_descriptions': [],
+            'meta_tags': [],
+            'property_tags': [],
+            'itemscopes': [],
+        }
+        self.done = False
+
+        self._head_open = False
+        self._head_closed = False
+        self._h1_depth = 0
+
+    def feed(self, data) -> bool:
+        ''' parse another chunk, returns True once every field is known '''
+        if self.done:
+            return True
+
+        self.parser.feed(data)
+        self._read_events()
+
+        return self.done
+
+    def close(self) -> Dict[str, list]:
+        if not self.done:
+            try:
+                self.parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            self._read_events()
+            self.done = True
+
+        return self.meta
+
+    def _read_events(self) -> None:
+        for event, el in self.parser.read_events():
+            tag = el.tag if isinstance(el.tag, str) else None
+
+            if event == 'start':
+                if tag == 'head':
+                    self._head_open = True
+                elif tag == 'h1':
+                    self._h1_depth += 1
+                continue
+
+            if tag == 'meta':
+                attrs = el.attrib
+                if attrs.get('name') == 'description':
+                    self.meta['meta_descriptions'].append(attrs.get('content'))
+
+                if 'content' in attrs:
+                    if 'name' in attrs:
+                        self.meta['meta_tags'].append((attrs['name'], attrs['content']))
+                    if 'property' in attrs:
+                        self.meta['property_tags'].append((attrs['property'], attrs['content']))
+
+            elif tag == 'title':
+                if self._head_open and not self._head_closed:
+                    self.meta['titles'].append(_string(el))
+
+            elif tag == 'head':
+                self._head_closed = True
+
+            elif tag == 'h1':
+                self._h1_depth -= 1
+                if not self.meta['h1s']:
+                    self.meta['h1s'].append(_string(el))
+
+            # finished elements are not needed again, unless an h1 still has to read them
+            if self._h1_depth == 0 and tag not in ('html', 'head', 'body'):
+                el.clear(keep_tail=True)
+
+            if self._head_closed and self.meta['h1s'] and self.meta['meta_descriptions']:
+                self.done = True
+                return
+
+
+def scan_head(chunks: Iterable[Union[str, bytes]], encoding: str = None) -> Dict[str, list]:
+    ''' run a HeadScanner over `chunks` (decoded text, or bytes in `encoding`), stopping early once it is done '''
+    scanner = HeadScanner(encoding)
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            break
+
+    return scanner.close()
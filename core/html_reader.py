@@ -2,35 +2,19 @@ from io import BytesIO
 from typing import Any, Callable, Dict, List
 from urllib.parse import urljoin, urlsplit
 
-from requests.models import Response
-import urllib3 
 import requests
+import urllib3
 from bs4 import BeautifulSoup, Comment
 
-from typing import List
-from pydantic import BaseModel, HttpUrl
+from core.encoding import decode_chunks
+from core.head_parser import scan_head
+from core.page import DEFAULT_HEADERS, DEFAULT_MAX_BYTES, Page
+from core.page_cache import PageCache
+from core.records import MetaReport, MetaTag, PropertyTag
+from core.session import get_session
 
 # import pdfkit
 
-class PropertyTag(BaseModel):
-    property: str
-    content: str
-
-class MetaTag(BaseModel):
-    name: str
-    content: str
-
-class MetaReport(BaseModel):
-    url: HttpUrl
-    domain: str
-    user_agent: str
-    titles: list
-    meta_descriptions: list
-    h1s: list
-    meta_tags: List[MetaTag]
-    og_tags: List[PropertyTag]
-    twitter_tags: List[PropertyTag]
-
 
 def clean(data):
     if isinstance(data, str):
@@ -41,111 +25,292 @@ def clean(data):
     return data
 
 
+# backends for the full parse: BeautifulSoup tree builders, plus selectolax's lexbor
+PARSERS = ('lxml', 'html.parser', 'html5lib', 'selectolax')
+DEFAULT_PARSER = 'lxml'
+
+
+def _lexbor_string(node) -> str:
+    '''
+    the same value BeautifulSoup's `tag.string` gives, for a selectolax node.
+    comments count as children there too, and a lone comment is the string
+    '''
+    children = list(node.iter(include_text=True))
+    if len(children) != 1:
+        return None
+
+    child = children[0]
+    if child.tag == '-text':
+        return child.text_content
+    if child.tag == '-comment':
+        return child.comment_content
+    return _lexbor_string(child)
+
+
 class HTMLReader:
-    def __init__(self, url: str, custom_header: str = None) -> None:
+    '''
+    extract titles, meta tags and h1s from a page.
+
+    `parser` picks the backend for the full parse (see PARSERS). lxml is the
+    fast default; html.parser and html5lib are the pure python BeautifulSoup
+    builders. selectolax (optional, `pip install selectolax`) is the fastest;
+    with it the extraction runs on the lexbor tree and a BeautifulSoup tree is
+    only built if schema_from_attrs or embeddable_html need one.
+
+    head_only=True is a faster mode for csv_report: instead of building a
+    full BeautifulSoup tree it parses incrementally with lxml and stops once
+    the head and the first h1 are read. without a page or a cache it also
+    stops reading the response body at that point (a cache only holds whole
+    pages, so with one the page is read from it or fetched into it). a body
+    that passes max_bytes before the scan is done fails, as it does for a
+    full page. in this mode `soup` is None, `h1s` holds only the first h1 and
+    schema_from_attrs / embeddable_html are unavailable.
+
+    if the page can't be loaded, `error` holds why and csv_report raises it.
+    '''
+
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, url: str, custom_header: str = None, page: Page = None, cache: PageCache = None,
+                 head_only: bool = False, parser: str = DEFAULT_PARSER, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser {parser}, choose one of {', '.join(PARSERS)}")
+
         self.url = url
         self.domain = None
+        self.cache = cache
+        self.head_only = head_only
+        self.parser = parser
+        self.max_bytes = max_bytes
+        # BeautifulSoup features used when a soup is needed
+        self.soup_parser = 'lxml' if parser == 'selectolax' else parser
         
-        self.headers = custom_header if custom_header else {
-            'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 12_1_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/16D57'
-        }
-
-        self.r: Response = None
+        self.headers = custom_header if custom_header else DEFAULT_HEADERS
+
+        # an already fetched page (shared with TextExtract) skips the download
+        self.r: Page = page
+        self._meta: Dict[str, list] = None
+        self.soup: BeautifulSoup = None
+        self.tree = None  # selectolax backend only
+        self.html: str = None
+        self.error: Exception = None
         try:
-            self.soup = self.make_soup()
+            if head_only:
+                self._meta = self.make_head()
+            elif parser == 'selectolax':
+                self.tree = self.make_tree()
+            else:
+                self.soup = self.make_soup()
         except Exception as e:
-            pass
+            self.error = e
+        
+
+    def _decoded_html(self, timeout: int=4) -> str:
+        if self.r is None:
+            self.r = Page.fetch(self.url, headers=self.headers, timeout=timeout, cache=self.cache, max_bytes=self.max_bytes)
+
+        u = urlsplit(self.r.url)
+        self.domain = f'{u.scheme}://{u.netloc}'
+
+        if self.r.is_html:
+            self.html = self.r.text
+            return self.html
         
+        raise ValueError(f"{self.url} did not produce valid HTML; Content returned as {self.r.content_type}")
 
     def make_soup(self, timeout: int=4) -> Callable[..., BeautifulSoup]:
+        # already decoded, so BeautifulSoup skips its own encoding detection
+        return BeautifulSoup(self._decoded_html(timeout), self.soup_parser)
+
+    def make_tree(self, timeout: int=4):
         try:
-            self.r = requests.get(self.url, headers=self.headers, timeout=timeout)
-            u = urlsplit(self.r.url)
-            self.domain = f'{u.scheme}://{u.netloc}'
-        except requests.exceptions.InvalidURL as e:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError:
+            raise ImportError("The selectolax parser needs `pip install selectolax`")
+
+        return LexborHTMLParser(self._decoded_html(timeout))
+
+    def ensure_soup(self) -> BeautifulSoup:
+        ''' the BeautifulSoup tree, built on demand for the selectolax backend '''
+        if self.soup is None and self.html is not None:
+            self.soup = BeautifulSoup(self.html, self.soup_parser)
+
+        return self.soup
+
+
+    def make_head(self, timeout: int=4) -> Dict[str, list]:
+        ''' head_only parse: the _scan() fields read incrementally, stopping early '''
+        if self.r is None and self.cache is not None:
+            page, stale = Page.lookup(self.url, self.cache)
+            self.r = page or Page.fetch(self.url, headers=self.headers, timeout=timeout, cache=self.cache,
+                                        max_bytes=self.max_bytes, cached=stale)
+
+        if self.r is not None:
+            if not self.r.is_html:
+                return self._scan_chunks(self.r, ())
+
+            # feed the page's decoded text so the charset is only worked out once
+            text = self.r.text
+            chunks = (text[i:i + self.CHUNK_SIZE] for i in range(0, len(text), self.CHUNK_SIZE))
+            return self._scan_chunks(self.r, chunks)
+
+        try:
+            r = get_session().get(self.url, headers=self.headers, timeout=timeout, stream=True)
+        except requests.exceptions.InvalidURL:
             raise ValueError(f"{self.url} is not a value URL")
-        except urllib3.exceptions.ReadTimeoutError as e:
+        except (urllib3.exceptions.ReadTimeoutError, requests.exceptions.Timeout):
             raise TimeoutError(f"{self.url} did not respond within {timeout} seconds")
-        
-        if not self.r.ok:
-            raise ConnectionError(f"{self.url} returned a status code of {self.r.status_code} {self.r.reason}")
 
-        if 'html' in self.r.headers['content-type']:
-            unicode_str = self.r.content.decode(self.r.apparent_encoding)
-            encoded_str = unicode_str.encode("UTF-8", 'ignore')
-            return BeautifulSoup(encoded_str, 'html.parser')
-        
-        raise ValueError(f"{self.url} did not produce valid HTML; Content returned as {self.r.headers['content-type']}")
+        with r:
+            # the body is only read as far as the scanner needs, so it is not kept
+            page = Page(self.url, r.url, r.status_code, r.reason, r.headers, b'')
+            if not page.ok:
+                raise ConnectionError(f"{self.url} returned a status code of {page.status_code} {page.reason}")
+
+            # decoded the same way as full pages, lxml's own guess falls back to latin-1
+            chunks = decode_chunks(r.headers, self._capped(r.iter_content(self.CHUNK_SIZE)))
+            return self._scan_chunks(page, chunks)
+
+    def _capped(self, chunks):
+        ''' a streamed body, failing once it passes max_bytes rather than scanning a cut off page '''
+        read = 0
+        for chunk in chunks:
+            read += len(chunk)
+            if self.max_bytes and read > self.max_bytes:
+                raise ValueError(f"{self.url} is over the {self.max_bytes} byte limit")
+            yield chunk
+
+    def _scan_chunks(self, page: Page, chunks) -> Dict[str, list]:
+        ''' run the head scan over decoded text chunks '''
+        self.r = page
+        u = urlsplit(self.r.url)
+        self.domain = f'{u.scheme}://{u.netloc}'
+
+        if not self.r.is_html:
+            raise ValueError(f"{self.url} did not produce valid HTML; Content returned as {self.r.content_type}")
+
+        meta = scan_head(chunks)
 
+        for key in ('titles', 'h1s', 'meta_descriptions'):
+            meta[key] = [clean(v) for v in meta[key]]
+
+        return meta
+
+    def _scan(self) -> Dict[str, list]:
+        '''
+        collect everything the extraction properties need in a single walk over
+        the tree: titles in <head>, h1s, meta name/content pairs, meta
+        property/content pairs and top level itemscopes. cached on the reader.
+        '''
+        if self._meta is not None:
+            return self._meta
+
+        if self.error is not None:
+            raise self.error
+
+        if self.soup is None and self.tree is not None:
+            self._meta = self._scan_tree()
+            return self._meta
+
+        head = self.soup.head
+        meta = {
+            'titles': [],
+            'h1s': [],
+            'meta_descriptions': [],
+            'meta_tags': [],
+            'property_tags': [],
+            'itemscopes': [],
+        }
+
+        for tag in self.soup.find_all(True):
+            name = tag.name
+            attrs = tag.attrs
+
+            if name == 'meta':
+                if attrs.get('name') == 'description':
+                    meta['meta_descriptions'].append(clean(attrs.get('content')))
+
+                if 'content' in attrs:
+                    if 'name' in attrs:
+                        meta['meta_tags'].append((attrs['name'], attrs['content']))
+                    if 'property' in attrs:
+                        meta['property_tags'].append((attrs['property'], attrs['content']))
+
+            elif name == 'h1':
+                meta['h1s'].append(clean(tag.string))
+
+            elif name == 'title':
+                if head is not None and any(p is head for p in tag.parents):
+                    meta['titles'].append(clean(tag.string))
+
+            if 'itemscope' in attrs and 'itemtype' in attrs and 'itemprop' not in attrs:
+                meta['itemscopes'].append(tag)
+
+        self._meta = meta
+        return meta
+
+    def _scan_tree(self) -> Dict[str, list]:
+        ''' _scan() for the selectolax backend, walking the lexbor tree once '''
+        meta = {
+            'titles': [],
+            'h1s': [],
+            'meta_descriptions': [],
+            'meta_tags': [],
+            'property_tags': [],
+            'itemscopes': [],
+        }
+
+        for node in self.tree.root.traverse(include_text=False):
+            name = node.tag
+            if name == 'meta':
+                # valueless attributes are None in lexbor, '' in BeautifulSoup
+                attrs = {k: v if v is not None else '' for k, v in node.attributes.items()}
+
+                if attrs.get('name') == 'description':
+                    meta['meta_descriptions'].append(clean(attrs.get('content')))
+
+                if 'content' in attrs:
+                    if 'name' in attrs:
+                        meta['meta_tags'].append((attrs['name'], attrs['content']))
+                    if 'property' in attrs:
+                        meta['property_tags'].append((attrs['property'], attrs['content']))
+
+            elif name == 'h1':
+                meta['h1s'].append(clean(_lexbor_string(node)))
+
+            elif name == 'title':
+                parent = node.parent
+                while parent is not None and parent.tag != 'head':
+                    parent = parent.parent
+                if parent is not None:
+                    meta['titles'].append(clean(_lexbor_string(node)))
+
+        return meta
 
     @property
     def titles(self) -> List[str]:
-        clean_titles = [clean(t.string) for t in self.soup.find('head').find_all('title')]
-        return clean_titles
+        return list(self._scan()['titles'])
 
     @property
     def h1s(self) -> List[str]:
-        clean_h1s = [clean(t.string) for t in self.soup.find_all('h1')]
-        return clean_h1s
+        return list(self._scan()['h1s'])
 
     @property
     def meta_descriptions(self) -> List[str]:
-        def is_md(tag):
-            return tag.name == 'meta' and tag.attrs.get('name') == 'description'
-
-        clean_mds = [clean(t.attrs.get('content'))
-               for t in self.soup.find_all(is_md)]
-
-        return clean_mds
+        return list(self._scan()['meta_descriptions'])
 
     @property
     def meta_tags(self) -> List[MetaTag]:
-
-        def is_meta(tag):
-            return all([
-                tag.name == 'meta',
-                tag.has_attr('name'),
-                tag.has_attr('content')
-            ])
-
-        meta_tags = [t for t in self.soup.find_all(is_meta)]
-
-        tags: List[Dict[str, str]] = []
-        for tag in meta_tags:
-            tags.append(
-                MetaTag(
-                    name=tag.attrs.get('name'),
-                    content=tag.attrs.get('content')
-                )
-            )
-
-        return tags
+        return [MetaTag(name=name, content=content) for name, content in self._scan()['meta_tags']]
     
     def property_tags(self, prop_filter=None) -> List[PropertyTag]:
-        
-        def is_prop(tag):
-            return all([
-                tag.name == 'meta',
-                tag.has_attr('property'),
-                tag.has_attr('content')
-            ])
-
-        prop_tags = self.soup.find_all(is_prop)
+        prop_tags = self._scan()['property_tags']
 
         if prop_filter:
             ''' og: twitter: and others'''
-            prop_tags = [t for t in prop_tags if t.attrs.get('property').startswith(prop_filter)]
-
-        tags = []
-        for tag in prop_tags:
-            tags.append(
-                PropertyTag(
-                    property=tag.attrs.get('property'),
-                    content=tag.attrs.get('content')
-                )
-            )
-
-        return tags
+            prop_tags = [t for t in prop_tags if t[0].startswith(prop_filter)]
+
+        return [PropertyTag(property=prop, content=content) for prop, content in prop_tags]
     
     @property
     def meta_report(self) -> MetaReport:
@@ -161,6 +326,7 @@ class HTMLReader:
             'twitter_tags': self.property_tags('twitter:'),
         }
 
+        # a light record; call .validate() on it for the pydantic MetaReport
         return MetaReport(**report)
     
     @staticmethod
@@ -169,6 +335,9 @@ class HTMLReader:
 
     @property
     def csv_report(self) -> Dict[str, str]:
+        if self.error is not None:
+            raise self.error
+
         report = {
             'url': self.r.url,
             'domain': self.domain,
@@ -220,14 +389,8 @@ class HTMLReader:
 
         with open(f"/Users/ian/git/BatchHTML/services/app/core/htmlreader/tests/{test_name}.html") as fp:
             print(fp)
-            self.soup = BeautifulSoup(fp, 'html.parser')
-
-        def is_parentscope(tag):
-            return all([
-                tag.has_attr('itemscope'),
-                tag.has_attr('itemtype'),
-                not tag.has_attr('itemprop')
-            ])
+            self.soup = BeautifulSoup(fp, self.soup_parser)
+            self._meta = None
 
         def is_itemscope(tag):
             return all([
@@ -283,7 +446,10 @@ class HTMLReader:
             else:
                 return None
 
-        itemscopes = [ps.extract() for ps in self.soup.find_all(is_parentscope)]
+        itemscopes = [ps.extract() for ps in self._scan()['itemscopes']]
+        # the tree changed, later extraction has to walk it again
+        self._meta = None
+
         scopes = []
         for scope in itemscopes:
             if new_scope := process_scope(scope):
@@ -297,6 +463,7 @@ class HTMLReader:
         if not self.html:
             return None
 
+        self.ensure_soup()
         base = self.soup.new_tag('base', href=self.domain, target='_blank_xap')
         self.soup.head.insert(0, base)
 
@@ -0,0 +1,136 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from statistics import quantiles
+from typing import Callable, Dict, Iterator, List
+
+
+class Stage:
+    '''
+    timings of one stage: exact count, sum and max, plus a fixed size random
+    sample of the durations for percentiles, so memory stays flat on long runs
+    '''
+
+    SAMPLE_SIZE = 10_000
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: List[float] = []
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+        if len(self.samples) < self.SAMPLE_SIZE:
+            self.samples.append(seconds)
+        elif (i := random.randrange(self.count)) < self.SAMPLE_SIZE:
+            self.samples[i] = seconds
+
+    def percentiles(self) -> Dict[str, float]:
+        if len(self.samples) < 2:
+            value = self.samples[0] if self.samples else 0.0
+            return {'p50': value, 'p95': value, 'p99': value}
+
+        cuts = quantiles(self.samples, n=100, method='inclusive')
+        return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+class Metrics:
+    '''
+    per-stage timers for a run, safe to share between threads.
+    stages are named freely ('download', 'parse', 'semrush', ...); callables
+    in `hooks` get (stage, seconds) for every timing as it is recorded.
+    usage:
+
+    with metrics.timer('download', row_timings):
+        page = Page.fetch(url)
+
+    metrics.record('nlp', 0.25)
+    print(metrics.report())
+    metrics.export('output_files/run.prom')   # or .json
+
+    '''
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Stage] = {}
+        self.hooks: List[Callable[[str, float], None]] = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, row: Dict[str, float] = None) -> None:
+        ''' add a timing; `row` (a row's own timings) gets it added to its total too '''
+        with self._lock:
+            self.stages.setdefault(stage, Stage()).add(seconds)
+
+        if row is not None:
+            row[stage] = row.get(stage, 0.0) + seconds
+
+        for hook in self.hooks:
+            hook(stage, seconds)
+
+    def record_all(self, timings: Dict[str, float], row: Dict[str, float] = None) -> None:
+        ''' add timings measured elsewhere, e.g. returned from a worker process '''
+        for stage, seconds in timings.items():
+            self.record(stage, seconds, row)
+
+    @contextmanager
+    def timer(self, stage: str, row: Dict[str, float] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, row)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {'count': s.count, 'total': s.total, 'max': s.max, **s.percentiles()}
+                for name, s in self.stages.items()
+            }
+
+    def report(self) -> str:
+        lines = [f"{'stage':<20} {'count':>8} {'total s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name, s in sorted(self.summary().items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{name:<20} {s['count']:>8} {s['total']:>10.1f} {s['p50'] * 1000:>9.1f} "
+                         f"{s['p95'] * 1000:>9.1f} {s['p99'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}")
+        return '\n'.join(lines)
+
+    def prometheus(self, prefix: str = 'batchfetch') -> str:
+        ''' the summary in the Prometheus text format, for node_exporter's textfile collector '''
+        name = f'{prefix}_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each fetch.py stage.',
+            f'# TYPE {name} summary',
+        ]
+        for stage, s in sorted(self.summary().items()):
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {s[key]:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {s["total"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {s["count"]}')
+
+        lines.append(f'# HELP {prefix}_run_start_time_seconds Unix time the run started.')
+        lines.append(f'# TYPE {prefix}_run_start_time_seconds gauge')
+        lines.append(f'{prefix}_run_start_time_seconds {self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str) -> None:
+        ''' write the summary to `path`: Prometheus text for .prom files, json otherwise '''
+        if path.endswith('.prom'):
+            body = self.prometheus()
+        else:
+            body = json.dumps({'started': self.started, 'stages': self.summary()}, indent=2)
+
+        # written whole and swapped in, so a scraper never reads half a file
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
@@ -0,0 +1,39 @@
+'''
+pydantic versions of the records in core.records. the hot paths build the
+light records; these are only used to validate at a boundary, through
+Record.validate()
+'''
+from typing import List, Optional
+
+from pydantic import BaseModel, HttpUrl
+
+
+class QueryResult(BaseModel):
+    ph: str
+    po: int
+    pd: Optional[str]
+    tr: float
+    nq: int
+    et: int
+    ur: HttpUrl
+    td: Optional[str]
+
+
+class PropertyTag(BaseModel):
+    property: str
+    content: str
+
+class MetaTag(BaseModel):
+    name: str
+    content: str
+
+class MetaReport(BaseModel):
+    url: HttpUrl
+    domain: str
+    user_agent: str
+    titles: list
+    meta_descriptions: list
+    h1s: list
+    meta_tags: List[MetaTag]
+    og_tags: List[PropertyTag]
+    twitter_tags: List[PropertyTag]
@@ -0,0 +1,163 @@
+from typing import Dict, Optional, Tuple
+
+import requests
+import urllib3
+from requests.structures import CaseInsensitiveDict
+
+from core.encoding import decode_html
+from core.page_cache import PageCache
+from core.session import get_session
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 12_1_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/16D57'
+}
+
+# largest body read before a download is abandoned
+DEFAULT_MAX_BYTES = 10 * 1024 ** 2
+CHUNK_SIZE = 64 * 1024
+
+
+def read_body(r: requests.Response, url: str, max_bytes: int) -> bytes:
+    ''' read a streamed response body, giving up once it passes `max_bytes` (0 for no cap) '''
+    length = r.headers.get('content-length', '')
+    if max_bytes and length.isdigit() and int(length) > max_bytes:
+        raise ValueError(f"{url} is {int(length)} bytes, over the {max_bytes} byte limit")
+
+    body = bytearray()
+    for chunk in r.iter_content(CHUNK_SIZE):
+        body += chunk
+        if max_bytes and len(body) > max_bytes:
+            raise ValueError(f"{url} is over the {max_bytes} byte limit")
+
+    return bytes(body)
+
+
+class Page:
+    '''
+    a single downloaded HTTP response, fetched once and shared by
+    TextExtract (newspaper parse/nlp) and HTMLReader (meta extraction)
+    usage:
+
+    page = Page.fetch('https://example.com/')
+    text = TextExtract(page.requested_url, page=page)
+    meta = HTMLReader(page.requested_url, page=page)
+
+    '''
+
+    def __init__(self, requested_url: str, url: str, status_code: int, reason: str,
+                 headers: Dict[str, str], content: bytes) -> None:
+        self.requested_url = requested_url
+        self.url = url  # final url after redirects
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self._decoded: Tuple[str, str] = None
+
+    @classmethod
+    def cached(cls, url: str, cache: PageCache) -> Optional['Page']:
+        ''' the page for `url` if the cache holds a fresh copy, else None '''
+        return cls.lookup(url, cache)[0]
+
+    @classmethod
+    def lookup(cls, url: str, cache: PageCache) -> Tuple[Optional['Page'], Optional[Tuple[Dict, bytes]]]:
+        '''
+        (page, None) if the cache holds a fresh copy of `url`, else (None, entry)
+        where entry is the stale copy, if any, to hand to fetch(cached=entry)
+        so it is revalidated without being read from disk again
+        '''
+        entry = cache.get(url)
+        if entry is None or not cache.is_fresh(entry[0]):
+            return None, entry
+
+        cache.hits += 1
+        return cls._from_cache(url, *entry), None
+
+    @classmethod
+    def _from_cache(cls, url: str, meta: Dict, body: bytes) -> 'Page':
+        return cls(url, meta['final_url'], meta['status_code'], meta['reason'], meta['headers'], body)
+
+    @classmethod
+    def fetch(cls, url: str, headers: Dict[str, str] = None, timeout: int = 4, cache: PageCache = None,
+              max_bytes: int = DEFAULT_MAX_BYTES, html_only: bool = True,
+              cached: Tuple[Dict, bytes] = None) -> 'Page':
+        '''
+        download `url`. the response headers are checked before the body is
+        read, so error pages and (with html_only) non-HTML content such as PDFs
+        or video are turned away without transferring them, and bodies over
+        `max_bytes` are abandoned part way. `cached` is the cache entry for
+        `url` when the caller already read it (see lookup).
+        '''
+        request_headers = dict(headers or DEFAULT_HEADERS)
+
+        entry = cached
+        if entry is None and cache:
+            entry = cache.get(url)
+        if entry:
+            if cache.is_fresh(entry[0]):
+                cache.hits += 1
+                return cls._from_cache(url, *entry)
+
+            # stale copy: ask the origin whether it changed
+            request_headers.update(cache.conditional_headers(entry[0]))
+
+        try:
+            r = get_session().get(url, headers=request_headers, timeout=timeout, stream=True)
+        except requests.exceptions.InvalidURL:
+            raise ValueError(f"{url} is not a value URL")
+        except (urllib3.exceptions.ReadTimeoutError, requests.exceptions.Timeout):
+            raise TimeoutError(f"{url} did not respond within {timeout} seconds")
+
+        # closing the response drops the connection if the body was left unread
+        with r:
+            if entry and r.status_code == 304:
+                cache.revalidated += 1
+                cache.touch(url, entry[0], r.headers)
+                return cls._from_cache(url, *entry)
+
+            page = cls(url, r.url, r.status_code, r.reason, r.headers, b'')
+
+            if not page.ok:
+                raise ConnectionError(f"{url} returned a status code of {page.status_code} {page.reason}")
+
+            if html_only and not page.is_html:
+                raise ValueError(f"{url} did not produce valid HTML; Content returned as {page.content_type}")
+
+            try:
+                page.content = read_body(r, url, max_bytes)
+            except requests.exceptions.RequestException as e:
+                raise ConnectionError(f"{url} failed while sending its body: {e}")
+
+        if cache:
+            cache.misses += 1
+            cache.put(url, page.url, page.status_code, page.reason, page.headers, page.content)
+
+        return page
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 400
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('content-type', '')
+
+    @property
+    def is_html(self) -> bool:
+        return 'html' in self.content_type
+
+    def _decode(self) -> Tuple[str, str]:
+        if self._decoded is None:
+            self._decoded = decode_html(self.headers, self.content)
+
+        return self._decoded
+
+    @property
+    def text(self) -> str:
+        ''' the body decoded once, shared by every consumer of the page '''
+        return self._decode()[0]
+
+    @property
+    def encoding(self) -> str:
+        return self._decode()[1]
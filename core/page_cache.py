@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    ''' lowercase scheme and host, drop default ports and fragments, sort the query '''
+    u = urlsplit(url.strip())
+    scheme = u.scheme.lower()
+    host = (u.hostname or '').lower()
+
+    if u.port and u.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{u.port}'
+
+    query = urlencode(sorted(parse_qsl(u.query, keep_blank_values=True)))
+
+    return urlunsplit((scheme, host, u.path or '/', query, ''))
+
+
+class PageCache:
+    '''
+    content addressed on-disk cache of downloaded pages, keyed by normalized URL.
+    each entry is a body file plus a json file with the final url, status and headers.
+
+    entries younger than `ttl` seconds are served without touching the network.
+    older entries are revalidated with If-None-Match / If-Modified-Since, and a
+    304 answer only refreshes their timestamp. once the cache is larger than
+    `max_bytes` the least recently used entries are evicted.
+    usage:
+
+    cache = PageCache('output_files/.cache', ttl=24 * 3600)
+    page = Page.fetch('https://example.com/', cache=cache)
+
+    '''
+
+    def __init__(self, directory: str, ttl: float = 24 * 3600, max_bytes: int = 1024 ** 3) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f'{base}.json', f'{base}.body'
+
+    def _entries(self):
+        ''' (meta path, entry size, last access) for every stored entry '''
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    stat = os.stat(meta_path)
+                    size = stat.st_size + os.path.getsize(body_path)
+                except OSError:
+                    continue
+
+                yield meta_path, size, stat.st_mtime
+
+    def get(self, url: str) -> Optional[Tuple[Dict, bytes]]:
+        ''' stored (meta, body) for `url`, or None '''
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+
+        # the meta file's mtime doubles as the LRU access time
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        return meta, body
+
+    def is_fresh(self, meta: Dict) -> bool:
+        return (time.time() - meta.get('stored_at', 0)) < self.ttl
+
+    def conditional_headers(self, meta: Dict) -> Dict[str, str]:
+        ''' request headers that let the origin answer 304 Not Modified '''
+        headers = {}
+        stored = {k.lower(): v for k, v in meta.get('headers', {}).items()}
+
+        if etag := stored.get('etag'):
+            headers['If-None-Match'] = etag
+        if last_modified := stored.get('last-modified'):
+            headers['If-Modified-Since'] = last_modified
+
+        return headers
+
+    def put(self, url: str, final_url: str, status_code: int, reason: str,
+            headers: Dict[str, str], body: bytes) -> None:
+        meta_path, body_path = self._paths(url)
+        meta = {
+            'url': url,
+            'final_url': final_url,
+            'status_code': status_code,
+            'reason': reason,
+            'headers': dict(headers),
+            'stored_at': time.time(),
+        }
+
+        with self._lock:
+            old_size = self._entry_size(meta_path, body_path)
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+            # body first, meta last: a meta file always points at a complete body
+            self._write(body_path, body)
+            self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+            self._size += self._entry_size(meta_path, body_path) - old_size
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def touch(self, url: str, meta: Dict, headers: Dict[str, str] = None) -> None:
+        ''' mark an entry as revalidated (304) so it is fresh for another ttl '''
+        meta_path, _ = self._paths(url)
+        meta['stored_at'] = time.time()
+        if headers:
+            meta['headers'].update({k: v for k, v in headers.items() if k.lower() in ('etag', 'last-modified')})
+
+        with self._lock:
+            self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def evict(self) -> None:
+        ''' drop least recently used entries until the cache is at 90% of max_bytes '''
+        with self._lock:
+            target = self.max_bytes * 0.9
+            for meta_path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+                if self._size <= target:
+                    break
+
+                body_path = meta_path[:-len('.json')] + '.body'
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self._size -= size
+
+    @staticmethod
+    def _entry_size(*paths: str) -> int:
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> str:
+        return f"Page cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} misses"
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+from core.metrics import metrics
+
+
+class TokenBucket:
+    '''
+    token bucket rate limiter, safe to share between threads and asyncio tasks.
+    `rate` tokens are added per second up to `capacity`; every request takes one.
+    callers reserve their token up front, so waiting callers queue in order and
+    requests go out exactly as fast as the rate allows. rate=0 disables limiting.
+    every wait is also recorded in core.metrics as the stage `stage`, if given.
+    usage:
+
+    bucket = TokenBucket(rate=10)   # 10 requests per second
+    bucket.acquire()                # from a thread
+    await bucket.acquire_async()    # from a coroutine
+
+    '''
+
+    def __init__(self, rate: float, capacity: float = 1, stage: str = None) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.stage = stage
+
+        self.requests = 0
+        self.total_wait = 0.0
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        ''' take a token now and return how long to wait before using it '''
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+
+            self.requests += 1
+            self.total_wait += wait
+
+        if self.stage:
+            metrics.record(self.stage, wait)
+
+        return wait
+
+    def acquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        return wait
+
+    @property
+    def wait_time(self) -> float:
+        ''' seconds a request made right now would wait '''
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def stats(self) -> str:
+        avg = self.total_wait / self.requests if self.requests else 0
+        return f"{self.requests} requests, {self.total_wait:.1f}s waited (avg {avg:.2f}s), current wait {self.wait_time:.2f}s"
+
+
+# host buckets live under their own prefix, so a host can't share an API's bucket
+HOST_PREFIX = 'host:'
+
+_limiters: Dict[str, TokenBucket] = {}
+_lock = threading.Lock()
+
+
+def _stage(name: str) -> str:
+    ''' the metrics stage of a bucket; hosts share one, a stage per host would never stop growing '''
+    return 'ratelimit:host' if name.startswith(HOST_PREFIX) else f'ratelimit:{name}'
+
+
+def limiter(name: str, rate: float = 0, capacity: float = 1) -> TokenBucket:
+    '''
+    the shared bucket called `name` (an API name, or HOST_PREFIX + host), created with
+    `rate` and `capacity` on first use. use configure() to change an existing one.
+    '''
+    with _lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucket(rate, capacity, stage=_stage(name))
+
+        return _limiters[name]
+
+
+def configure(name: str, rate: float, capacity: float = 1) -> TokenBucket:
+    with _lock:
+        _limiters[name] = TokenBucket(rate, capacity, stage=_stage(name))
+
+        return _limiters[name]
+
+
+def host_limiter(url: str, rate: float, capacity: float = 1) -> TokenBucket:
+    ''' the shared bucket for the host of `url` '''
+    return limiter(HOST_PREFIX + urlsplit(url).netloc.lower(), rate, capacity)
+
+
+def limiters() -> Dict[str, TokenBucket]:
+    with _lock:
+        return dict(_limiters)
@@ -0,0 +1,114 @@
+'''
+textstat's english readability scores, from a single pass over the text
+
+textstat recomputes its counts for every score it is asked for, and its
+per-text caches only hold 128 entries. sentence_count alone fills them with
+one entry per sentence, so on a real article the word count, syllables and
+difficult words end up being worked out again for each score.
+'''
+import math
+import os
+import re
+from functools import lru_cache
+from importlib.util import find_spec
+
+from pyphen import Pyphen
+
+# textstat's defaults: en_US, apostrophes removed, outputs rounded
+PUNCTUATION = re.compile(r'[^\w\s]')
+SENTENCE = re.compile(r'\b[^.!?]+[.!?]*', re.UNICODE)
+DALE_CHALL_TOKEN = re.compile(r"[\w\='‘’]+")
+
+FRE_BASE = 206.835
+FRE_SENTENCE_LENGTH = 1.015
+FRE_SYLLABLES_PER_WORD = 84.6
+
+_pyphen = Pyphen(lang='en_US')
+_easy_words = None
+
+
+def easy_words() -> frozenset:
+    ''' the Dale-Chall list of familiar words, as shipped with textstat '''
+    global _easy_words
+    if _easy_words is None:
+        # found without importing textstat, which is slow to import
+        package_dir = find_spec('textstat').submodule_search_locations[0]
+        with open(os.path.join(package_dir, 'resources', 'en', 'easy_words.txt'), encoding='utf-8') as f:
+            _easy_words = frozenset(line.strip() for line in f.read().split('\n'))
+
+    return _easy_words
+
+
+@lru_cache(maxsize=100_000)
+def syllables(word: str) -> int:
+    ''' syllables of one lowercase word, the way textstat counts them with pyphen '''
+    return len(_pyphen.positions(word)) + 1
+
+
+def legacy_round(number: float, points: int = 0) -> float:
+    ''' textstat's rounding: half away from zero '''
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+
+class Readability:
+    '''
+    counts words, sentences, syllables and difficult words once, then derives
+    the scores from them. every value matches textstat 0.7 called the same way.
+    usage:
+
+    scores = Readability(article.text)
+    scores.words, scores.sentences
+    scores.flesch_reading_ease, scores.flesch_kincaid_grade, scores.dale_chall
+
+    '''
+
+    def __init__(self, text: str) -> None:
+        self.words = len(PUNCTUATION.sub('', text).split())
+
+        # sentences of two words or fewer don't count, as in textstat
+        self.sentences = max(1, sum(
+            1 for sentence in SENTENCE.findall(text)
+            if len(PUNCTUATION.sub('', sentence).split(maxsplit=2)) > 2
+        ))
+
+        lower = text.lower()
+        self.syllables = sum(map(syllables, PUNCTUATION.sub('', lower).split()))
+
+        # distinct tokens not on the easy list (textstat's difficult_words with syllable_threshold=0)
+        self.difficult_words = len(set(DALE_CHALL_TOKEN.findall(lower)) - easy_words())
+
+    @property
+    def avg_sentence_length(self) -> float:
+        return legacy_round(self.words / self.sentences, 1)
+
+    @property
+    def avg_syllables_per_word(self) -> float:
+        if not self.words:
+            return 0.0
+        return legacy_round(self.syllables / self.words, 1)
+
+    @property
+    def flesch_reading_ease(self) -> float:
+        score = (FRE_BASE
+                 - FRE_SENTENCE_LENGTH * self.avg_sentence_length
+                 - FRE_SYLLABLES_PER_WORD * self.avg_syllables_per_word)
+        return legacy_round(score, 2)
+
+    @property
+    def flesch_kincaid_grade(self) -> float:
+        score = 0.39 * self.avg_sentence_length + 11.8 * self.avg_syllables_per_word - 15.59
+        return legacy_round(score, 1)
+
+    @property
+    def dale_chall(self) -> float:
+        if not self.words:
+            return 0.0
+
+        per_easy_words = float(self.words - self.difficult_words) / float(self.words) * 100
+        per_difficult_words = 100 - per_easy_words
+
+        score = 0.1579 * per_difficult_words + 0.0496 * self.avg_sentence_length
+        if per_difficult_words > 5:
+            score += 3.6365
+        return legacy_round(score, 2)
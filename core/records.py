@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+class Record:
+    '''
+    base for the slotted record types built on hot paths (a row per SEMRush
+    keyword, one per meta tag). they cost a fraction of a pydantic model to
+    build and hold; validate() turns one into its pydantic model (MODEL, in
+    core.models) when checked data is wanted.
+    '''
+
+    __slots__ = ()
+    MODEL: str = None
+
+    def dict(self) -> Dict[str, Any]:
+        return {f: _plain(getattr(self, f)) for f in self.__slots__}
+
+    def validate(self):
+        import core.models as models
+        return getattr(models, self.MODEL)(**self.dict())
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Record):
+        return value.dict()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+@dataclass(slots=True)
+class QueryRecord(Record):
+    ''' a url_organic keyword row '''
+    MODEL = 'QueryResult'
+
+    ph: str
+    po: int
+    pd: Optional[str]
+    tr: float
+    nq: int
+    et: int
+    ur: str
+    td: Optional[str]
+
+
+@dataclass(slots=True)
+class PropertyTag(Record):
+    MODEL = 'PropertyTag'
+
+    property: str
+    content: str
+
+
+@dataclass(slots=True)
+class MetaTag(Record):
+    MODEL = 'MetaTag'
+
+    name: str
+    content: str
+
+
+@dataclass(slots=True)
+class MetaReport(Record):
+    MODEL = 'MetaReport'
+
+    url: str
+    domain: str
+    user_agent: str
+    titles: list
+    meta_descriptions: list
+    h1s: list
+    meta_tags: List[MetaTag]
+    og_tags: List[PropertyTag]
+    twitter_tags: List[PropertyTag]
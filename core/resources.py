@@ -0,0 +1,81 @@
+'''
+nlp data files: provisioned once (provision.py), loaded once per process
+
+newspaper's Article.nlp() splits sentences with NLTK's punkt tokenizer and
+re-reads its stopword file for every article. warm() loads both up front,
+and TextExtract calls it, so every extract in a process (or process pool
+worker) shares one copy.
+'''
+import threading
+
+# what newspaper's nlp asks NLTK for
+PUNKT_ENGLISH = 'tokenizers/punkt/english.pickle'
+
+_lock = threading.Lock()
+_warm_languages = set()
+
+
+class MissingResource(LookupError):
+    pass
+
+
+def have_punkt() -> bool:
+    ''' is punkt on NLTK's data path (~/nltk_data, $NLTK_DATA, ...), without touching the network '''
+    import nltk
+
+    try:
+        nltk.data.find(PUNKT_ENGLISH)
+    except LookupError:
+        return False
+
+    return True
+
+
+def provision(download_dir: str = None, update: bool = False, quiet: bool = False) -> bool:
+    '''
+    download punkt if it is missing (or always, with update=True).
+    the only place that goes to the network; returns False if the download failed
+    '''
+    import nltk
+
+    if have_punkt() and not update:
+        return True
+
+    return nltk.download('punkt', download_dir=download_dir, quiet=quiet, raise_on_error=False)
+
+
+def warm(language: str = 'en') -> None:
+    '''
+    load punkt and the stopwords for `language` into this process. cheap
+    after the first call, and safe as a ProcessPoolExecutor initializer
+    '''
+    if language in _warm_languages:
+        return
+
+    with _lock:
+        if language in _warm_languages:
+            return
+
+        import nltk
+        from newspaper import nlp
+
+        try:
+            # nltk.data caches what it loads, later split_sentences calls reuse it
+            nltk.data.load(PUNKT_ENGLISH)
+        except LookupError:
+            raise MissingResource("NLTK punkt is not installed, run `python provision.py` once")
+
+        if not _warm_languages:
+            load_stopwords = nlp.load_stopwords
+            loaded = set()
+
+            def load_stopwords_once(lang: str) -> None:
+                # Article.nlp() reloads the file every time, the set only ever grows
+                if lang not in loaded:
+                    load_stopwords(lang)
+                    loaded.add(lang)
+
+            nlp.load_stopwords = load_stopwords_once
+
+        nlp.load_stopwords(language)
+        _warm_languages.add(language)
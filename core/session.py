@@ -0,0 +1,66 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_settings = {
+    'pool_size': 10,
+    'retries': 3,
+    'backoff_factor': 0.5,
+}
+_session: requests.Session = None
+_lock = threading.Lock()
+
+
+def configure(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5) -> None:
+    '''
+    set up the shared session used by every HTTP client in core.
+    pool_size caps keep-alive connections per host; 429 and 5xx answers are
+    retried `retries` times with exponential backoff (honouring Retry-After).
+    '''
+    global _session
+
+    with _lock:
+        _settings.update(pool_size=pool_size, retries=retries, backoff_factor=backoff_factor)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=_settings['retries'],
+        backoff_factor=_settings['backoff_factor'],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand the last answer back so callers can report it
+    )
+    adapter = HTTPAdapter(
+        pool_connections=100,  # hosts kept in the pool manager
+        pool_maxsize=_settings['pool_size'],  # connections per host
+        pool_block=True,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def get_session() -> requests.Session:
+    ''' the process wide session with pooled keep-alive connections '''
+    global _session
+
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+
+    return _session
@@ -0,0 +1,146 @@
+import csv
+import heapq
+import os
+import zlib
+from typing import Iterator, List, Tuple
+from urllib.parse import urlsplit
+
+from core.checkpoint import Checkpoint
+from core.sinks import SINKS, format_for
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    ''' "2/8" -> (2, 8); shards are numbered from 1 '''
+    try:
+        number, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"--shard expects i/N, like 1/4, got {spec}")
+
+    if count < 1 or not 1 <= number <= count:
+        raise ValueError(f"--shard {spec} is out of range, i must be 1 to {count}")
+
+    return number, count
+
+
+def shard_key(key_value: str, keywords: bool = False) -> str:
+    ''' what a row is partitioned on: the host for urls, so one domain stays on one shard '''
+    if not keywords:
+        host = urlsplit(key_value.strip()).netloc.lower()
+        if host:
+            return host
+
+    return key_value.strip().lower()
+
+
+def shard_of(key_value: str, count: int, keywords: bool = False) -> int:
+    ''' the shard (1 to count) a row belongs to, the same on every machine and run '''
+    return zlib.crc32(shard_key(key_value, keywords).encode('utf-8')) % count + 1
+
+
+def shard_output_path(output_file: str, number: int, count: int) -> str:
+    root, ext = os.path.splitext(output_file)
+    return f'{root}_shard{number}of{count}{ext}'
+
+
+def keyword_output_path(output_file: str) -> str:
+    ''' the -s keyword results file that goes with an output file '''
+    return output_file.replace('_all_results_', '_keyword_results_')
+
+
+def _records(f, format: str) -> Iterator:
+    ''' csv rows, or raw lines for jsonl, which go back out unchanged '''
+    return csv.reader(f) if format == 'csv' else iter(f)
+
+
+def _journaled_rows(output_file_path: str, data_path: str, column: int) -> Iterator[Tuple[int, List]]:
+    '''
+    (input index, records) for every committed row of one shard, in input order.
+    the journal belongs to `output_file_path`, the records are read from `data_path`
+    and `column` picks the journal count for it: 2 for output rows, 3 for keyword rows
+    '''
+    entries = Checkpoint(output_file_path).entries()
+
+    # rows without a url are journaled but write nothing, so the file may never have been made
+    if not os.path.exists(data_path) and not any(entry[column] for entry in entries):
+        return
+
+    format = format_for(data_path)
+    with open(data_path, encoding='utf-8', newline='') as f:
+        records = _records(f, format)
+        if format == 'csv':
+            next(records, None)
+
+        for entry in entries:
+            yield entry[0], [next(records) for _ in range(entry[column])]
+
+
+def empty_shard(output_file_path: str) -> bool:
+    '''
+    a shard that wrote no rows: it never made an output file, and either got
+    no input rows (no journal) or only rows without a url (a journal whose
+    commits all say nothing was written)
+    '''
+    if os.path.exists(output_file_path):
+        return False
+
+    if not Checkpoint.exists(output_file_path):
+        return True
+
+    # the first size is the output file's; a keyword file's (with -s) is never 0, it has a header
+    checkpoint = Checkpoint(output_file_path)
+    output_size = next(iter(checkpoint.sizes()), 0)
+    return not output_size and not any(rows or keyword_rows for _, _, rows, keyword_rows in checkpoint.entries())
+
+
+def merge_shards(shard_paths: List[str], merged_path: str, keywords: bool = False) -> int:
+    '''
+    combine the outputs of a sharded run back into input order. each shard's
+    journal says which input row every output row came from, so only rows
+    that were committed are merged. keywords=True merges the keyword results
+    files that go with `shard_paths` instead. csv and jsonl outputs can be
+    merged; the columnar formats can be concatenated by any arrow reader.
+    shards that got no rows at all (see empty_shard) are skipped.
+    returns the number of rows written.
+    '''
+    shard_paths = [path for path in shard_paths if not empty_shard(path)]
+    if not shard_paths:
+        raise ValueError("None of the shards has any rows")
+
+    column = 3 if keywords else 2
+    data_paths = [keyword_output_path(path) if keywords else path for path in shard_paths]
+
+    formats = {format_for(path) for path in data_paths}
+    if len(formats) != 1 or not SINKS[next(iter(formats))].appendable:
+        raise ValueError("Only csv or jsonl shards, all in the same format, can be merged")
+    format = formats.pop()
+
+    for path in shard_paths:
+        if not Checkpoint.exists(path):
+            raise ValueError(f"{path} has no journal, it can't be put back in input order")
+
+    if format == 'csv':
+        headers = set()
+        for path in data_paths:
+            with open(path, encoding='utf-8', newline='') as f:
+                headers.add(tuple(next(csv.reader(f), [])))
+
+        if len(headers) != 1:
+            raise ValueError("Shards have different columns, were they run with the same flags?")
+
+    shards = (_journaled_rows(path, data, column) for path, data in zip(shard_paths, data_paths))
+    merged = heapq.merge(*shards, key=lambda entry: entry[0])
+
+    written = 0
+    with open(merged_path, 'w', encoding='utf-8', newline='') as f:
+        if format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(headers.pop())
+            write = writer.writerows
+        else:
+            write = f.writelines
+
+        for _, records in merged:
+            write(records)
+            written += len(records)
+
+    return written
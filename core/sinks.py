@@ -0,0 +1,233 @@
+import csv
+import json
+import os
+from typing import Any, Dict, List, Type
+
+
+class Sink:
+    '''
+    where CSVBuilder writes its rows. every sink takes the full list of
+    headers up front and is handed buffered batches of row dicts; keys that
+    are not headers are ignored, missing ones are left empty.
+
+    `types` maps columns to the python type their values have (int, float,
+    bool or str) where the producer knows it; typed formats use it instead
+    of guessing from the data.
+
+    row formats (csv, jsonl) can be appended to and truncated back to a
+    checkpointed size, so --resume and merge.py work with them. the columnar
+    formats (parquet, arrow) only become readable once they are closed.
+    '''
+
+    # values are written as text, so CSVBuilder escapes newlines for them
+    escape_new_lines = False
+    # files can be continued and cut back to a size recorded in a checkpoint
+    appendable = True
+
+    def __init__(self, path: str, headers: List[str], append: bool = False, encoding: str = 'utf-8',
+                 types: Dict[str, Type] = None) -> None:
+        self.path = path
+        self.headers = list(headers)
+        self.append = append
+        self.encoding = encoding
+        self.types = dict(types or {})
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def tell(self) -> int:
+        ''' bytes written so far '''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class CSVSink(Sink):
+    escape_new_lines = True
+
+    def __init__(self, path: str, headers: List[str], append: bool = False, encoding: str = 'utf-8',
+                 types: Dict[str, Type] = None) -> None:
+        super().__init__(path, headers, append, encoding, types)
+        self.file = open(path, 'a' if append else 'w', encoding=encoding, newline='')
+        self.writer = csv.DictWriter(self.file, self.headers, extrasaction="ignore")
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JSONLSink(Sink):
+    ''' one json object per line, values keep their python types '''
+
+    def __init__(self, path: str, headers: List[str], append: bool = False, encoding: str = 'utf-8',
+                 types: Dict[str, Type] = None) -> None:
+        super().__init__(path, headers, append, encoding, types)
+        self.file = open(path, 'a' if append else 'w', encoding=encoding, newline='')
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.file.writelines(
+            json.dumps({h: row.get(h) for h in self.headers}, ensure_ascii=False, default=str) + '\n'
+            for row in rows
+        )
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow output need `pip install pyarrow`")
+
+    return pyarrow
+
+
+class ArrowSink(Sink):
+    '''
+    Arrow IPC file. columns declared in `types` get that type. the others
+    are worked out from the first batch: bools stay bools, any numbers are
+    float64 (so ints and floats can follow each other), anything else, and
+    columns still empty in that batch, is a string. a later value that does
+    not fit its column's type is written as null and counted in `coerced`.
+    '''
+
+    appendable = False
+
+    ARROW_TYPES = {int: 'int64', float: 'float64', bool: 'bool_', str: 'string'}
+
+    def __init__(self, path: str, headers: List[str], append: bool = False, encoding: str = 'utf-8',
+                 types: Dict[str, Type] = None) -> None:
+        if append:
+            raise ValueError(f"{path}: {type(self).__name__} output can't be appended to, use csv or jsonl to resume")
+
+        super().__init__(path, headers, append, encoding, types)
+        self.pa = _import_pyarrow()
+        self.file = self.pa.OSFile(path, 'wb')
+        self.schema = None
+        self.writer = None
+        self.coerced = 0
+
+    def _column_type(self, header: str, values: List[Any]):
+        pa = self.pa
+        if header in self.types:
+            return getattr(pa, self.ARROW_TYPES[self.types[header]])()
+
+        seen = {type(v) for v in values if v is not None}
+
+        if not seen:
+            return pa.string()
+        if seen == {bool}:
+            return pa.bool_()
+        if seen <= {int, float}:
+            return pa.float64()
+
+        return pa.string()
+
+    def _convert(self, value: Any, kind: str) -> Any:
+        if value is None or kind == 'string':
+            return value if value is None else str(value)
+
+        numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if kind == 'bool' and isinstance(value, bool):
+            return value
+        if kind == 'int64' and numeric and float(value).is_integer():
+            return int(value)
+        if kind == 'double' and numeric:
+            return float(value)
+
+        self.coerced += 1
+        return None
+
+    def _open_writer(self, schema):
+        return self.pa.ipc.new_file(self.file, schema)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+
+        columns = [[row.get(h) for row in rows] for h in self.headers]
+
+        if self.schema is None:
+            self.schema = self.pa.schema([(h, self._column_type(h, c)) for h, c in zip(self.headers, columns)])
+            self.writer = self._open_writer(self.schema)
+
+        arrays = [
+            self.pa.array([self._convert(v, str(field.type)) for v in column], type=field.type)
+            for field, column in zip(self.schema, columns)
+        ]
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        if self.writer is None:
+            # nothing was written: still leave a valid, empty file
+            self.schema = self.pa.schema([(h, self._column_type(h, [])) for h in self.headers])
+            self.writer = self._open_writer(self.schema)
+
+        self.writer.close()
+        self.file.close()
+
+        if self.coerced:
+            print(f"{self.path}: {self.coerced} values did not match their column type and were left empty")
+
+
+class ParquetSink(ArrowSink):
+    ''' Parquet file, written one row group per batch '''
+
+    def _open_writer(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.file, schema)
+
+
+SINKS = {
+    'csv': CSVSink,
+    'jsonl': JSONLSink,
+    'parquet': ParquetSink,
+    'arrow': ArrowSink,
+}
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+def format_for(path: str, default: str = 'csv') -> str:
+    ''' the output format implied by a file extension '''
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def open_sink(path: str, headers: List[str], format: str = None, append: bool = False, encoding: str = 'utf-8',
+              types: Dict[str, Type] = None) -> Sink:
+    format = format or format_for(path)
+    if format not in SINKS:
+        raise ValueError(f"Unknown output format {format}, choose one of {', '.join(SINKS)}")
+
+    return SINKS[format](path, headers, append=append, encoding=encoding, types=types)
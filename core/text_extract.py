@@ -1,50 +1,92 @@
+import time
+from typing import Dict, Tuple
+
 from newspaper import Article
-import nltk
-import textstat
 import math
 
+import core.resources as resources
+from core.page import Page
+from core.readability import Readability
+
+
+def text_report(url: str, html: str) -> Tuple[Dict[str, str], Dict[str, float]]:
+    '''
+    parse, nlp and score already downloaded html.
+    module level so it can be sent to a ProcessPoolExecutor.
+    returns the report and the seconds each stage took in the worker
+    '''
+    extract = TextExtract(url, html=html)
+    report = extract.content_report
+
+    return report, extract.timings
+
 
 class TextExtract:
-    def __init__(self, url: str, update_punkt=False) -> None:
+    def __init__(self, url: str, update_punkt=False, page: Page = None, html: str = None) -> None:
+        # seconds spent in parse, nlp and readability scoring
+        self.timings: Dict[str, float] = {}
+
         if update_punkt:
             self.update_punkt()
+
+        # punkt and stopwords, loaded once per process (see core.resources)
+        resources.warm()
         
         try:
+            # newspaper's own download reads any body in full, so fetch it here instead
+            if page is None and html is None:
+                page = Page.fetch(url)
+
+            # decoded text, so newspaper does not run its own charset detection again
+            if page:
+                html = page.text
+
             self.article = Article(url)
-            self._html = self.article.download()
+            # reuse already fetched html instead of downloading again
+            self.article.download(input_html=html)
+
+            start = time.perf_counter()
             self.article.parse()
+            self.timings['parse'] = time.perf_counter() - start
+
+            start = time.perf_counter()
             self.article.nlp()
+            self.timings['nlp'] = time.perf_counter() - start
         except:
             raise ConnectionError("Failed to download or parse URL.")
     
     @property
     def get_html(self):
         return self.article.html
-    
+
     @staticmethod
     def update_punkt():
-        nltk.download('punkt')
+        ''' kept for older callers, provision.py (core.resources.provision) does this now '''
+        return resources.provision()
 
     @property
     def content_report(self):
         text = self.article.text
         if text:
+            start = time.perf_counter()
 
-            word_count = textstat.lexicon_count(text)
-            sentence_count = textstat.sentence_count(text)
-            dc_score = textstat.dale_chall_readability_score(text)
-            fre_score = textstat.flesch_reading_ease(text)
-            fk_grade = textstat.flesch_kincaid_grade(text)
+            # one pass for every count, the same scores textstat gives
+            scores = Readability(text)
+            word_count = scores.words
+            sentence_count = scores.sentences
+            dc_score = scores.dale_chall
+            fre_score = scores.flesch_reading_ease
+            fk_grade = scores.flesch_kincaid_grade
 
-            return {
+            report = {
                 'Source Domain': self.article.source_url,
                 'Keywords': ','.join(self.article.keywords),
                 'Summary': self.article.summary.replace('\r\n','\n'),
                 'Top Image':self.article.top_image,
                 'Words': word_count,
                 'Sentences': sentence_count,
-                'Reading time (sec)': self._reading_time_in_seconds(text),
-                'Reading time (min)': self._reading_time_in_minutes(text),
+                'Reading time (sec)': self._reading_time_in_seconds(word_count),
+                'Reading time (min)': self._reading_time_in_minutes(word_count),
                 'Dale/Chall Score': dc_score,
                 'Dale/Chall Score Name': self._dale_chall_to_text(dc_score),
                 'Flesch Reading Ease Score': fre_score,
@@ -52,11 +94,27 @@ class TextExtract:
                 'Flesch/Kincade Grade': fk_grade,
                 'Flesch/Kincade Grade Name': self._kincade_to_text(fk_grade),
             }
+            self.timings['readability'] = time.perf_counter() - start
+
+            return report
         else:
             return {
                 'Source URL': self.article.source_url
             }
     
+    @staticmethod
+    def column_types():
+        ''' the numeric columns of content_report '''
+        return {
+            'Words': int,
+            'Sentences': int,
+            'Reading time (sec)': int,
+            'Reading time (min)': int,
+            'Dale/Chall Score': float,
+            'Flesch Reading Ease Score': float,
+            'Flesch/Kincade Grade': float,
+        }
+
     @staticmethod
     def headers():
         return [
@@ -76,16 +134,15 @@ class TextExtract:
             'Flesch/Kincade Grade Name',
         ]
     
-    def _reading_time_in_seconds(self, text: str, wpm=200) -> int:
-        wc = textstat.lexicon_count(text)
+    def _reading_time_in_seconds(self, wc: int, wpm=200) -> int:
         decimal_minutes = round(wc/wpm, 3)
         mins = math.floor(decimal_minutes)
         secs = (decimal_minutes - mins)*60
 
         return math.floor((mins*60) + secs)
 
-    def _reading_time_in_minutes(self, text: str, wpm=200, rounding=True) -> float:
-        secs = self._reading_time_in_seconds(text, wpm)
+    def _reading_time_in_minutes(self, wc: int, wpm=200, rounding=True) -> float:
+        secs = self._reading_time_in_seconds(wc, wpm)
         if rounding:
             return round(secs/60)
         else:
@@ -1,15 +1,26 @@
 import argparse
-import csv
+import asyncio
+import os
 import time
-from typing import Dict
+from typing import Dict, Iterator, List, Set, Tuple
 
+import core.ratelimit as ratelimit
+import core.session as session
+from core.apis.cache import QueryCache
 from core.apis.semrush import SEMRushQuery
+from core.checkpoint import Checkpoint
 from core.csv_builder import CSVBuilder
-from core.html_reader import HTMLReader
-from core.text_extract import TextExtract
+from core.engine import FetchEngine
+from core.metrics import metrics
+from core.page_cache import PageCache
+from core.shard import keyword_output_path, parse_shard, shard_of, shard_output_path
+from core.sinks import EXTENSIONS, SINKS, format_for, open_sink
 
+# per-row stages, in the order --timing-columns writes them
+ROW_STAGES = ['delay', 'cache', 'download', 'parse', 'nlp', 'readability', 'html', 'semrush']
 
-def main():
+
+def parse_args():
     '''
     python fetch.py /path/to/input.csv -c url -f project_name --api_key=XXXXXXXXXXXXXXXXXXX
     
@@ -34,113 +45,372 @@ def main():
 
     parser.add_argument('--api_key', metavar='api_key', type=str, help='apikey')
 
-    parser.add_argument('-d', "--delay", type=float, help='seconds between requests', default=1.5)
+    parser.add_argument("--head-only", help="Read meta columns with a fast incremental parse that stops after the head and first h1",
+                    action="store_true", default=False)
+
+    parser.add_argument("--parser", type=str, help='HTML parser backend for meta extraction: lxml, html.parser, html5lib or selectolax', default='lxml')
+
+    parser.add_argument('-d', "--delay", type=float, help='minimum seconds between requests to the same host', default=1.5)
     parser.add_argument('-l', "--limit", type=int, help='max rows to pull', default=100_000)
     parser.add_argument('-o', "--offset", type=int, help='initial rows to skip', default=0)
+    parser.add_argument('-n', "--concurrency", type=int, help='rows fetched at once', default=8)
+    parser.add_argument('-b', "--batch-size", type=int, help='phrases per SEMRush call in keyword mode (max 100)', default=SEMRushQuery.MAX_BATCH_PHRASES)
+    parser.add_argument("--format", type=str, choices=SINKS, help='output format: csv, jsonl, parquet or arrow (default: csv, or the --resume file\'s extension)')
+    parser.add_argument("--shard", type=str, help='run one part of the input, i/N like 1/4; rows are split by host (or keyword) so the same part always gets the same rows')
+    parser.add_argument("--resume", metavar='output', type=str, help='continue an interrupted run, appending to this output file')
+    parser.add_argument("--cache-dir", type=str, help='keep downloaded pages in this directory and reuse them on later runs')
+    parser.add_argument("--cache-ttl", type=float, help='hours a cached page is used before it is revalidated', default=24)
+    parser.add_argument("--cache-size", type=int, help='max size of the page cache in MB', default=1024)
+    parser.add_argument("--max-bytes", type=float, help='largest page body to download in MB, bigger pages are skipped (0 for no limit)', default=10)
+    parser.add_argument("--api-cache", type=str, help='sqlite file caching SEMRush responses', default='output_files/.api_cache.sqlite')
+    parser.add_argument("--api-cache-days", type=float, help='days a cached SEMRush response stays valid', default=30)
+    parser.add_argument("--no-api-cache", help="always query SEMRush live", action="store_true", default=False)
+    parser.add_argument("--api-rps", type=float, help='SEMRush requests per second (your api quota)', default=SEMRushQuery.RATE_LIMIT)
+    parser.add_argument("--pool-size", type=int, help='keep-alive connections per host (default: --concurrency)')
+    parser.add_argument("--retries", type=int, help='retries with backoff on 429 and 5xx answers', default=3)
+    parser.add_argument("--timing-columns", help="Add a seconds column per stage (download, parse, nlp, ...) to every row",
+                    action="store_true", default=False)
+    parser.add_argument("--metrics-out", type=str, help='write per-stage timings here during the run, Prometheus text for .prom files, json otherwise')
+    parser.add_argument('-w', "--workers", type=int, help='processes for NLP and scoring (0 runs them in-process)', default=os.cpu_count())
 
     args = parser.parse_args()
 
-    timestr = time.strftime("%Y%m%d-%H%M%S")
-    output_file = f'output_files/{args.f}_all_results_{timestr}.csv'
+    if args.keywords:
+        args.text = False
+        args.seo = False
+
+    if args.text:
+        from core.html_reader import PARSERS
+        if args.parser not in PARSERS:
+            parser.error(f"--parser must be one of {', '.join(PARSERS)}")
+
+    args.batch_size = max(1, min(args.batch_size, SEMRushQuery.MAX_BATCH_PHRASES))
+
+    if args.shard:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    args.format = args.format or (format_for(args.resume) if args.resume else 'csv')
+    if args.resume and not SINKS[args.format].appendable:
+        parser.error(f"--resume needs a csv or jsonl output, {args.format} files can't be continued")
+
+    return args
+
+
+def rows_to_process(builder: CSVBuilder, args, done: Set[Tuple[int, str]]) -> Iterator[Tuple[int, Dict[str, str], str]]:
+    ''' yield (index, row, key value) for every row inside offset/limit that is not `done` yet '''
+    # the reader seeks to the offset instead of parsing every skipped row
+    for i, row in builder.rows(start=args.offset):
+        if i >= (args.limit + args.offset):
+            print(f"Row limit ({args.limit}) reached!\nProcessed rows {args.offset + 1} -> {i}")
+            break
+        
+        key_value = row.get(args.c)
+
+        if not key_value:
+            print(i+1, key_value)
+            print(f"    ... Column `{args.c}` not found")
+            break
+
+        if (i, key_value) in done:
+            continue
+
+        if args.shard and shard_of(key_value, args.shard[1], keywords=args.keywords) != args.shard[0]:
+            continue
+
+        yield i, row, key_value
+
+
+def timing_columns(timings: Dict[str, float]) -> Dict[str, float]:
+    return {f'Time {stage} (sec)': round(timings.get(stage, 0.0), 4) for stage in ROW_STAGES}
+
+
+async def text_data(engine: FetchEngine, args, uri: str, log: List[str], timings: Dict[str, float]) -> Dict[str, str]:
+    # newspaper, nltk and bs4 take most of a second to import, so the
+    # text stack (core.html_reader, core.text_extract) is only imported by the
+    # modes that use it. -k runs and short jobs start without it.
+    from core.html_reader import HTMLReader
+    from core.text_extract import text_report
+
+    new_data = {}
+    results = {}
+
+    # download once, then share the page with both extractors
+    try:
+        page = await engine.fetch_page(uri, row=timings, max_bytes=int(args.max_bytes * 1024 ** 2))
+        # decoding (and charset detection) is cached on the page, do it off the event loop
+        text = await engine.run_blocking(lambda: page.text)
+    except Exception as e:
+        page = None
+        results['text'] = results['meta'] = f"Failed: {e}"
+
+    if page:
+        try:
+            # parse, nlp and readability scoring run on the process pool
+            report, worker_timings = await engine.run_cpu(text_report, uri, text)
+            metrics.record_all(worker_timings, timings)
+            new_data.update(report)
+            results['text'] = "Success"
+        except Exception as e:
+            results['text'] = f"Failed: {e}"
+
+        try:
+            with metrics.timer('html', timings):
+                # the tree walk behind csv_report runs on the thread pool too
+                report = await engine.run_blocking(
+                    lambda: HTMLReader(uri, page=page, head_only=args.head_only, parser=args.parser).csv_report)
+            new_data.update(report)
+            results['meta'] = "Success"
+        except Exception as e:
+            results['meta'] = f"Failed: {e}"
+
+    log.append(f"    Text Extract:  {results['text']}")
+    log.append(f"    Meta Extract:  {results['meta']}")
+
+    return new_data
+
+
+async def seo_data(engine: FetchEngine, args, uri: str, log: List[str], timings: Dict[str, float]) -> Tuple[Dict[str, str], List[Dict]]:
+    q = SEMRushQuery(args.api_key, cache=args.query_cache)
+    q.add_filter("+", "Po", "Lt", 21)
+    
+    # SEMRushQuery paces itself against the api quota, so this includes its wait
+    try:
+        with metrics.timer('semrush', timings):
+            await engine.run_blocking(q.request, uri, limit=25)
+        if not q.response.ok:
+            raise ConnectionError(f"SEMRush returned a status code of {q.response.status_code} {q.response.reason}")
+    except Exception as e:
+        # a timeout or http error fails this row's seo columns, not the run
+        log.append(f"    SEO Results:   Failed: {e}")
+        return {'Est. Monthly SEO Traffic': None, 'Top SEO Keywords': f"Failed: {e}"}, []
+    
+    seo_data = {
+        'Est. Monthly SEO Traffic': 0,
+        'Top SEO Keywords': ''
+    }
+
+    # columns straight from the parser, no per-row objects needed for the totals
+    columns = q.result_columns
+    keyword_rows = [r.dict() for r in q.results]
+    seo_data['Est. Monthly SEO Traffic'] = sum(columns['et'])
+    seo_keywords = [ph for ph, tr in zip(columns['ph'], columns['tr']) if tr > 4.9]
+    
+    seo_data['Top SEO Keywords'] = ', '.join(seo_keywords)
+
+    log.append(f"    SEO Results:   Keywords: {len(keyword_rows)}, Est. Traffic: {seo_data['Est. Monthly SEO Traffic']}")
+
+    return seo_data, keyword_rows
+
+
+async def process_row(engine: FetchEngine, args, item: Tuple[int, Dict[str, str], str]):
+    ''' returns (index, row, key value, new data or None to skip, log lines, keyword rows) '''
+    i, row, key_value = item
+    log = []
+    keyword_rows = []
+
+    uri = key_value
+    if uri.startswith('http') == False:
+        log.append("    ... No URL")
+        return i, row, key_value, None, log, keyword_rows
+
+    new_data: Dict[str, str] = dict()
+    timings: Dict[str, float] = dict()
+
+    if args.text:
+        new_data.update(await text_data(engine, args, uri, log, timings))
+    
+    if args.seo:
+        seo, keyword_rows = await seo_data(engine, args, uri, log, timings)
+        new_data.update(seo)
+
+    if args.timing_columns:
+        new_data.update(timing_columns(timings))
+
+    return i, row, key_value, new_data, log, keyword_rows
 
-    builder = CSVBuilder(args.i, output_file_path=output_file)
+
+async def process_keywords(engine: FetchEngine, args, items: List[Tuple[int, Dict[str, str], str]]):
+    ''' look up a batch of phrases in as few SEMRush calls as possible, one result per row '''
+    semrush = SEMRushQuery(args.api_key, cache=args.query_cache)
+    phrases = [key_value for _, _, key_value in items]
+    timings: Dict[str, float] = dict()
+    with metrics.timer('semrush', timings):
+        await engine.run_blocking(semrush.request_volumes, phrases)
+
+    # one call answers the whole batch, so every row carries the batch's timings
+    extra = timing_columns(timings) if args.timing_columns else {}
+
+    return [(i, row, phrase, {**(semrush.keyword_results(phrase) or {}), **extra}, [], []) for i, row, phrase in items]
+
+
+async def process_batch(engine: FetchEngine, args, items: List[Tuple[int, Dict[str, str], str]]):
+    if args.keywords:
+        return await process_keywords(engine, args, items)
+
+    return [await process_row(engine, args, item) for item in items]
+
+
+def batched(rows: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+async def run(args) -> None:
+    if args.resume:
+        output_file = args.resume
+    else:
+        timestr = time.strftime("%Y%m%d-%H%M%S")
+        extension = next(ext for ext, format in EXTENSIONS.items() if format == args.format)
+        output_file = f'output_files/{args.f}_all_results_{timestr}{extension}'
+        if args.shard:
+            output_file = shard_output_path(output_file, *args.shard)
+    kw_output_file = keyword_output_path(output_file)
+
+    # finished rows are journaled next to the output so any run can be resumed
+    checkpoint = Checkpoint(output_file)
+    done = set()
+    if args.resume:
+        done = checkpoint.restore(output_file, kw_output_file) if args.seo else checkpoint.restore(output_file)
+        print(f"Resuming {output_file}: {len(done)} rows already finished")
+
+    builder = CSVBuilder(args.i, output_file_path=output_file, append=bool(args.resume), output_format=args.format)
     
     if args.text:
+        # imported here, not at the top, for the same reason as in text_data
+        from core.html_reader import HTMLReader
+        from core.text_extract import TextExtract
+
         builder.add_headers(HTMLReader.csv_headers())
-        builder.add_headers(TextExtract.headers())
+        builder.add_headers(TextExtract.headers(), types=TextExtract.column_types())
      
     if args.seo:
-        builder.add_headers(['Est. Monthly SEO Traffic', 'Top SEO Keywords'])
-        
+        builder.add_headers(['Est. Monthly SEO Traffic', 'Top SEO Keywords'], types={'Est. Monthly SEO Traffic': int})
+        keyword_sink = open_sink(kw_output_file, SEMRushQuery.headers(), format=args.format, append=bool(args.resume),
+                                 types=SEMRushQuery.column_types())
+        keyword_buffer = []
+
     if args.keywords:
         builder.add_headers(['Keyword', 'Search Volume', 'Trends'])
-        kw_output_file = f'output_files/{args.f}_keyword_results_{timestr}.csv'
-        keyword_file = open(kw_output_file, mode="w", encoding="utf-8")
-        keyword_writer = csv.DictWriter(keyword_file, SEMRushQuery.headers(), extrasaction='ignore')
-        keyword_writer.writeheader()
-    
-    with builder:
-        for i, row in enumerate(builder.input_reader):
-            if i < (args.offset):
-                continue
-            
-            if i >= (args.limit + args.offset):
-                print(f"Row limit ({args.limit}) reached!\nProcessed rows {args.offset + 1} -> {i}")
-                break
-            
-            key_value = row.get(args.c)
-            print(i+1, key_value)
 
-            if not key_value:
-                print(f"    ... Column `{args.c}` not found")
-                break
-            
-            if (args.text or args.seo):
-                uri = key_value
-                if uri == None or uri.startswith('http') == False:
-                    print("    ... No URL")
-                    continue
-            
-                new_data: Dict[str, str] = dict()
-                results = {}
-
-                if args.text:
-                    try:
-                        text_extactor = TextExtract(uri, update_punkt=(i==0))
-                        new_data.update(text_extactor.content_report)
-                        results['text'] = "Success"
-                    except Exception as e:
-                        results['text'] = f"Failed: {e}"
-
-                
-                    print("    Text Extract: ", results['text'])
-
-                    try:
-                        html_reader = HTMLReader(uri)
-                        new_data.update(html_reader.csv_report)
-                        results['meta'] = "Success"
-                    except Exception as e:
-                        results['meta'] = f"Failed: {e}"
-                
-                    print("    Meta Extract: ", results['meta'])
-                
-                if args.seo:
-                    q = SEMRushQuery(args.api_key)
-                    q.add_filter("+", "Po", "Lt", 21)
-                    
-                    q.request(uri, limit=25)
-                    
-                    seo_data = {
-                        'Est. Monthly SEO Traffic': 0,
-                        'Top SEO Keywords': ''
-                    }
-
-                    seo_keywords = []
-                    for r in q.results:
-                        keyword_writer.writerow(r.dict())
-                        seo_data['Est. Monthly SEO Traffic'] += r.et
-                        if r.tr > 4.9:
-                            seo_keywords.append(r.ph)
-                    
-                    seo_data['Top SEO Keywords'] = ', '.join(seo_keywords)
-
-                    print("    SEO Results: ", f" Keywords: {len(q.results)}, Est. Traffic: {seo_data['Est. Monthly SEO Traffic']}")
-
-                    new_data.update(seo_data)
-            
-                builder.append_data(row, new_data)
-            
-            elif args.keywords:
-                phrase = key_value
-                semrush = SEMRushQuery()
-                semrush.request_volume(phrase)
-                new_data = semrush.keyword_results()
-                builder.append_data(row, new_data)
-
-            time.sleep(args.delay)
-        
-    if args.keywords:
-        keyword_file.close()
+    if args.timing_columns:
+        builder.add_headers(list(timing_columns({})), types=dict.fromkeys(timing_columns({}), float))
+
+    last_export = time.monotonic()
+
+    def export_metrics(force: bool = False):
+        nonlocal last_export
+        # a scrape every 15s is plenty, and keeps small flushes cheap
+        if args.metrics_out and (force or time.monotonic() - last_export >= 15):
+            metrics.export(args.metrics_out)
+            last_export = time.monotonic()
+
+    def commit_checkpoint():
+        # runs after every builder flush, once the rows are on disk
+        if args.seo:
+            # keyword rows go out with the builder's batches, so both files stay in step
+            keyword_sink.write(keyword_buffer)
+            keyword_sink.flush()
+            keyword_buffer.clear()
+            checkpoint.commit(builder.output_size, keyword_sink.tell())
+        else:
+            checkpoint.commit(builder.output_size)
+
+        export_metrics()
+
+    builder.flush_hooks.append(commit_checkpoint)
+
+    args.query_cache = None
+    engine = None
+
+    # closed on errors and Ctrl-C too, so the process pool stops and the journal and sinks are flushed
+    try:
+        # one pooled keep-alive session for pages and APIs alike
+        session.configure(pool_size=args.pool_size or args.concurrency, retries=args.retries)
+
+        ratelimit.configure('semrush', args.api_rps)
+
+        # shared by every SEMRushQuery of the run
+        if (args.seo or args.keywords) and not args.no_api_cache:
+            args.query_cache = QueryCache(args.api_cache, max_age=args.api_cache_days * 86400)
+
+        cache = None
+        if args.cache_dir and args.text:
+            cache = PageCache(args.cache_dir, ttl=args.cache_ttl * 3600, max_bytes=args.cache_size * 1024 ** 2)
+
+        warm = None
+        if args.text:
+            import core.resources as resources
+
+            # a broken initializer would take the whole process pool down with it
+            if resources.have_punkt():
+                warm = resources.warm
+            else:
+                print("NLTK punkt is not installed, text columns will fail. Run `python provision.py` once")
+
+        engine = FetchEngine(concurrency=args.concurrency, delay=args.delay,
+                             workers=args.workers if args.text else 0, cache=cache, initializer=warm)
+
+        with builder:
+            # keyword lookups go out in multi-phrase batches, urls one row at a time
+            rows = batched(rows_to_process(builder, args, done), args.batch_size if args.keywords else 1)
+            worker = lambda items: process_batch(engine, args, items)
+
+            # results arrive in input order, so the output matches the input
+            async for results in engine.map(rows, worker):
+                for i, row, key_value, new_data, log, keyword_rows in results:
+                    print(i+1, key_value)
+                    for line in log:
+                        print(line)
+
+                    if args.seo:
+                        keyword_buffer.extend(keyword_rows)
+
+                    checkpoint.mark(i, key_value, rows=int(new_data is not None), keyword_rows=len(keyword_rows))
+
+                    if new_data is not None:
+                        builder.append_data(row, new_data)
+    finally:
+        if engine is not None:
+            engine.close()
+        checkpoint.close()
+
+        if args.query_cache:
+            args.query_cache.close()
+
+        if args.seo:
+            keyword_sink.close()
+
+    if cache:
+        print(cache.stats())
+
+    if args.query_cache:
+        print(args.query_cache.stats())
+
+    host_wait = 0.0
+    for name, bucket in ratelimit.limiters().items():
+        if name.startswith(ratelimit.HOST_PREFIX):
+            host_wait += bucket.total_wait
+        elif bucket.requests:
+            print(f"Rate limit {name}: {bucket.stats()}")
+    print(f"Rate limit hosts: {host_wait:.1f}s waited for politeness")
+
+    print(metrics.report())
+    export_metrics(force=True)
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,38 @@
+import argparse
+import os
+
+from core.shard import empty_shard, keyword_output_path, merge_shards
+
+
+def main():
+    '''
+    python merge.py output_files/project_all_results_*_shard*of4.csv -o output_files/project_all_results.csv
+
+    '''
+    parser = argparse.ArgumentParser(description='''
+            merge the outputs of a --shard run back into input order
+        ''')
+    parser.add_argument('shards', metavar='shard', type=str, nargs='+', help='output csv of each shard')
+    parser.add_argument('-o', "--output", type=str, help='merged csv', required=True)
+    args = parser.parse_args()
+
+    shards = [path for path in args.shards if not empty_shard(path)]
+    for path in sorted(set(args.shards) - set(shards)):
+        print(f"{path}: no rows in this shard, skipped")
+
+    rows = merge_shards(shards, args.output)
+    print(f"{args.output}: {rows} rows from {len(shards)} shards")
+
+    # -s runs also wrote keyword results next to each shard
+    if all(os.path.exists(keyword_output_path(path)) for path in shards) and keyword_output_path(shards[0]) != shards[0]:
+        kw_output = keyword_output_path(args.output)
+        if kw_output == args.output:
+            root, ext = os.path.splitext(args.output)
+            kw_output = f'{root}_keyword_results{ext}'
+
+        rows = merge_shards(args.shards, kw_output, keywords=True)
+        print(f"{kw_output}: {rows} keyword rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import sys
+
+import core.resources as resources
+
+
+def main():
+    '''
+    python provision.py
+    python provision.py --dir /opt/nltk_data --update
+
+    downloads the NLTK data the text extract needs (punkt), once per machine.
+    fetch.py never downloads it itself, so offline workers just need the
+    directory copied to them or $NLTK_DATA pointed at it.
+    '''
+    parser = argparse.ArgumentParser(description='''
+            install the nlp data files fetch.py needs
+        ''')
+    parser.add_argument("--dir", type=str, help='download here instead of NLTK\'s default (~/nltk_data); set $NLTK_DATA to it for fetch.py')
+    parser.add_argument("--update", help="download again even if punkt is already installed", action="store_true", default=False)
+    args = parser.parse_args()
+
+    if resources.have_punkt() and not args.update and not args.dir:
+        print("NLTK punkt is already installed")
+        return
+
+    if not resources.provision(download_dir=args.dir, update=True):
+        sys.exit("NLTK punkt could not be downloaded")
+
+    print("NLTK punkt installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from core.csv_input import CSVInput
+
+
+class CSVInputTest(unittest.TestCase):
+    '''
+    CSVInput gives the rows csv.DictReader gives over the file in text mode,
+    from the top and from an offset, before and after the row index is saved
+    '''
+
+    ROWS = [['https://example.com/1', 'one'], ['https://example.com/2', 'multi\nline'],
+            ['https://example.com/3', 'ünïcode'], ['https://example.com/4', 'four']]
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, encoding: str, line_end: str) -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding=encoding, newline='') as f:
+            writer = csv.writer(f, lineterminator=line_end)
+            writer.writerow(['location', 'note'])
+            writer.writerows(self.ROWS)
+        return path
+
+    def expected(self, path: str, encoding: str, start: int = 0):
+        with open(path, encoding=encoding, newline='') as f:
+            return list(enumerate(csv.DictReader(f)))[start:]
+
+    def check(self, path: str, encoding: str):
+        for _ in range(2):
+            # the second pass seeks through the index the first one saved
+            with CSVInput(path, encoding=encoding, index_every=2) as reader:
+                self.assertEqual(reader.fieldnames, ['location', 'note'])
+                self.assertEqual(list(reader.rows()), self.expected(path, encoding))
+                self.assertEqual(list(reader.rows(start=3)), self.expected(path, encoding, start=3))
+
+    def test_line_endings(self):
+        for name, line_end in (('lf', '\n'), ('crlf', '\r\n'), ('cr', '\r')):
+            with self.subTest(line_end=name):
+                self.check(self.write(f'{name}.csv', 'utf-8', line_end), 'utf-8-sig')
+
+    def test_cr_endings_are_indexed(self):
+        path = self.write('cr.csv', 'utf-8', '\r')
+        with CSVInput(path, index_every=2) as reader:
+            list(reader.rows())
+
+        self.assertTrue(os.path.exists(f'{path}{CSVInput.INDEX_SUFFIX}'))
+
+    def test_utf16_and_utf32(self):
+        for encoding in ('utf-16', 'utf-32'):
+            with self.subTest(encoding=encoding):
+                path = self.write(f'{encoding}.csv', encoding, '\r\n')
+                self.check(path, encoding)
+                self.assertFalse(os.path.exists(f'{path}{CSVInput.INDEX_SUFFIX}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from core.checkpoint import Checkpoint
+from core.shard import empty_shard, merge_shards, shard_output_path
+
+
+class MergeShardsTest(unittest.TestCase):
+    '''
+    three shards the way fetch.py leaves them: one with rows, one that only
+    got rows without a url (a journal but no output file) and one that got
+    nothing at all
+    '''
+
+    HEADER = ['location', 'Title']
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        output = os.path.join(self.dir.name, 'run_all_results_1.csv')
+        self.paths = [shard_output_path(output, n, 3) for n in (1, 2, 3)]
+
+        # shard 1: input rows 0 and 2 have urls
+        with open(self.paths[0], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows([['https://a.example/', 'A'], ['https://a.example/2', 'A2']])
+            size = f.tell()
+
+        checkpoint = Checkpoint(self.paths[0])
+        checkpoint.mark(0, 'https://a.example/')
+        checkpoint.mark(2, 'https://a.example/2')
+        checkpoint.commit(size)
+        checkpoint.close()
+
+        # shard 2: input rows 1 and 3 are not urls, so nothing is written
+        checkpoint = Checkpoint(self.paths[1])
+        checkpoint.mark(1, 'not a url', rows=0)
+        checkpoint.mark(3, 'not a url either', rows=0)
+        checkpoint.commit(0)
+        checkpoint.close()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_empty_shards(self):
+        self.assertEqual([empty_shard(path) for path in self.paths], [False, True, True])
+
+    def test_merge_skips_shards_without_rows(self):
+        merged = os.path.join(self.dir.name, 'merged.csv')
+        self.assertEqual(merge_shards(self.paths, merged), 2)
+
+        with open(merged, encoding='utf-8', newline='') as f:
+            self.assertEqual(list(csv.reader(f)), [self.HEADER, ['https://a.example/', 'A'], ['https://a.example/2', 'A2']])
+
+    def test_no_rows_anywhere(self):
+        with self.assertRaises(ValueError):
+            merge_shards(self.paths[1:], os.path.join(self.dir.name, 'merged.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()